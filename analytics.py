@@ -0,0 +1,246 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+from collections import Counter
+
+import artifacts
+import attempt_log
+import bank
+import cache
+import grading
+import metrics
+from attempt_log import ATTEMPT_LOG_PATH
+from executor import GradingExecutor
+
+# Offline analytics over the attempt log. One pass over the log, in memory
+# that does not grow with it: per question, the most common wrong answers
+# (space-saving sketch), how often answers could not be read, check latency and
+# time-to-correct (bucketed histograms). The most frequent inputs of each bank
+# question can be exported, with their verdicts and LaTeX, as a warm-start file
+# that the app puts in its verdict cache at startup, so they are answered from
+# the cache from the first check of the day.
+#
+#   python analytics.py -o report.json
+#   python analytics.py --export-warm-start          # writes .cache/warm_start.json
+
+WARM_START_PATH = os.environ.get(
+    "MATH22_WARM_START", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "warm_start.json")
+)
+
+SKETCH_SIZE = 256           # answers tracked per question; any answer above 1/256 of its attempts is kept
+DEFAULT_TOP = 5             # most common wrong answers listed per question
+DEFAULT_WARM_START = 50     # most common inputs exported per question
+
+# Time-to-correct bucket upper bounds, in seconds
+TIME_BUCKETS = (5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+# Verdicts that mean the answer could not be read
+PARSE_FAILURES = (grading.INVALID, grading.REJECTED)
+
+
+class SpaceSaving:
+    # Top-k heavy hitters in bounded memory (Metwally et al.'s space-saving sketch):
+    # keeps at most size counters; a new item replaces the smallest one and inherits its count
+    def __init__(self, size=SKETCH_SIZE):
+        self.size = size
+        self._counts = {}   # item -> [count, overestimate]
+        self._heap = []     # one (count, item) per item; the count may be behind, never ahead
+
+    def add(self, item):
+        counter = self._counts.get(item)
+        if counter is not None:
+            counter[0] += 1
+            return
+        count = 0
+        if len(self._counts) >= self.size:
+            # Pop until an entry is up to date: that item has the smallest count
+            while True:
+                count, smallest = heapq.heappop(self._heap)
+                actual = self._counts[smallest][0]
+                if actual == count:
+                    break
+                heapq.heappush(self._heap, (actual, smallest))
+            del self._counts[smallest]
+        self._counts[item] = [count + 1, count]
+        heapq.heappush(self._heap, (count + 1, item))
+
+    # Function to list the k most frequent items as (item, count, overestimate), most frequent first
+    def top(self, k):
+        items = sorted(self._counts.items(), key=lambda item: (-item[1][0], item[0]))[:k]
+        return [(item, count, error) for item, (count, error) in items]
+
+
+class QuestionStats:
+    def __init__(self):
+        self.attempts = 0
+        self.sessions = 0
+        self.verdicts = Counter()
+        self.wrong = SpaceSaving()
+        self.inputs = SpaceSaving()
+        self.latency = metrics.Histogram()
+        self.solved = 0
+        self.attempts_to_correct = 0
+        self.time_to_correct = metrics.Histogram(TIME_BUCKETS)
+
+
+# Function to normalize an answer the way the verdict cache keys it
+def normalize(answer):
+    return "".join(answer.split())
+
+
+# Function to read the attempt log in one pass; returns {question id: QuestionStats}.
+# Time-to-correct runs from a session's first attempt at a question to its first correct one.
+def analyze(path=ATTEMPT_LOG_PATH):
+    connection = attempt_log.connect(path)
+    rows = connection.execute(
+        "SELECT session, question, time, answer, verdict, seconds FROM attempts ORDER BY session, question, id"
+    )
+    stats = {}
+    current = None      # (session, question) being followed
+    first_time = tries = solved = None
+    for session, question, time, answer, verdict, seconds in rows:
+        item = stats.get(question)
+        if item is None:
+            item = stats[question] = QuestionStats()
+        if (session, question) != current:
+            current = (session, question)
+            first_time, tries, solved = time, 0, False
+            item.sessions += 1
+
+        answer = normalize(answer)
+        item.attempts += 1
+        item.verdicts[verdict] += 1
+        item.inputs.add(answer)
+        if verdict == grading.INCORRECT:
+            item.wrong.add(answer)
+        item.latency.observe(seconds)
+
+        tries += 1
+        if verdict == grading.CORRECT and not solved:
+            solved = True
+            item.solved += 1
+            item.attempts_to_correct += tries
+            item.time_to_correct.observe(time - first_time)
+    connection.close()
+    return stats
+
+
+def _quantile(histogram, q, scale=1.0):
+    value = histogram.quantile(q)
+    return None if math.isnan(value) else value * scale
+
+
+# Function to summarize the stats: one row per question (latency in ms, time-to-correct in seconds)
+def report(stats, top=DEFAULT_TOP):
+    rows = []
+    for question in sorted(stats):
+        item = stats[question]
+        failures = sum(item.verdicts[verdict] for verdict in PARSE_FAILURES)
+        rows.append({
+            "question": question,
+            "attempts": item.attempts,
+            "sessions": item.sessions,
+            "verdicts": dict(item.verdicts),
+            "parse_failure_rate": round(failures / item.attempts, 3),
+            "latency_ms": {f"p{p}": _quantile(item.latency, p / 100, 1000) for p in (50, 90, 99)},
+            "solved_sessions": item.solved,
+            "mean_attempts_to_correct": round(item.attempts_to_correct / item.solved, 2) if item.solved else None,
+            "time_to_correct_s": {f"p{p}": _quantile(item.time_to_correct, p / 100) for p in (50, 90)},
+            "top_wrong_answers": [{"answer": answer, "count": count} for answer, count, _ in item.wrong.top(top)],
+        })
+    return rows
+
+
+# Function to regrade the most common inputs of every bank question and write them as a
+# warm-start file for the verdict cache; returns the number of entries written
+def export_warm_start(stats, path=WARM_START_PATH, top=DEFAULT_WARM_START, executor=None):
+    own_executor = executor is None
+    if own_executor:
+        artifacts.prepare()
+        executor = GradingExecutor()
+    entries = []
+    try:
+        for question in sorted(stats):
+            try:
+                page, index = bank.parse_question_id(question)
+            except KeyError:
+                continue  # Generated exercises and questions no longer in the bank
+            f_x = bank.get_question(page, index)[1]
+            for answer, count, _ in stats[question].inputs.top(top):
+                # Graded again rather than trusting the log: the verdict must match the current
+                # pipeline, and the app needs the LaTeX to show the answer
+                result = executor.grade(answer, f_x)
+                if result.verdict in grading.UNCACHED:
+                    continue  # Says nothing about the answer, so it is never cached
+                entries.append({
+                    "question": question,
+                    "answer": answer,
+                    "count": count,
+                    "verdict": result.verdict,
+                    "latex": result.latex,
+                    "reason": result.reason,
+                    "fingerprint": result.fingerprint,
+                })
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"bank_version": bank.version(), "entries": entries}, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+    return len(entries)
+
+
+# Function to put the warm-start entries in the shared verdict cache. Skipped (returns 0) if
+# the file is missing or was made for another version of the question bank.
+def load_warm_start(path=WARM_START_PATH):
+    try:
+        with open(path) as f:
+            warm_start = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if warm_start.get("bank_version") != bank.version():
+        return 0
+
+    cache.verdicts.watch(bank.version())  # So the first check does not clear what is loaded here
+    loaded = 0
+    for entry in warm_start.get("entries", []):
+        try:
+            page, index = bank.parse_question_id(entry["question"])
+        except KeyError:
+            continue
+        result = grading.Result(entry["verdict"], '', entry["latex"], entry["reason"], entry["fingerprint"])
+        cache.verdicts.put(cache.make_key(page, index, entry["answer"]), result)
+        loaded += 1
+    return loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze the attempt log, and export a warm start for the verdict cache.")
+    parser.add_argument("--path", default=ATTEMPT_LOG_PATH, help="attempt log database")
+    parser.add_argument("-o", "--output", help="write the report as JSON to this file (default: stdout)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="wrong answers listed per question")
+    parser.add_argument("--export-warm-start", nargs="?", const=WARM_START_PATH, metavar="PATH",
+                        help=f"write the warm-start file (default: {WARM_START_PATH})")
+    parser.add_argument("--warm-start-size", type=int, default=DEFAULT_WARM_START, help="inputs exported per question")
+    args = parser.parse_args(argv)
+
+    stats = analyze(args.path)
+    text = json.dumps(report(stats, args.top), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.export_warm_start:
+        print(text)
+
+    if args.export_warm_start:
+        written = export_warm_start(stats, args.export_warm_start, args.warm_start_size)
+        print(f"{written} warm-start entries written to {args.export_warm_start}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
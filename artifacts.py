@@ -0,0 +1,160 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import namedtuple
+
+import bank
+
+# On-disk cache of what every check needs to know about a question's integrand:
+# the parsed integrand, its values at the sample points (nan where it is
+# undefined, so this is also its valid sample domain) and its fingerprint.
+# Entries are keyed on a hash of the integrand text, and the whole file is
+# dropped when anything that changes the values does (sample points,
+# tolerances, SymPy/NumPy versions). The lambdified evaluator itself cannot be
+# stored; its values at the sample points are all a check uses. The exact value
+# of every definite integral in the bank is stored alongside, keyed on a hash
+# of its integrand and bounds, so no worker repeats the quadrature.
+#
+#   python artifacts.py            # build the cache for every question in the bank
+#
+# Entry points that start grading workers call prepare() first, so the workers
+# load the stored artifacts instead of computing them.
+
+ARTIFACTS_PATH = os.environ.get(
+    "MATH22_ARTIFACTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "artifacts.pickle")
+)
+
+# expr: pickled SymPy expression of the integrand
+# values: integrand at checker.SAMPLE_POINTS (nan where undefined)
+# valid: number of sample points where the integrand is defined
+# fingerprint: checker.fingerprint(values)
+Artifact = namedtuple("Artifact", "expr values valid fingerprint")
+
+_artifacts = None
+_values = None
+_lock = threading.Lock()
+
+
+# Function to hash an integrand into its cache key
+def item_key(f_x):
+    return hashlib.sha256(f_x.encode()).hexdigest()[:16]
+
+
+# Function to hash a definite integral (a bank.Definite) into its cache key
+def value_key(definite):
+    return item_key("\n".join(definite))
+
+
+# Function to hash every setting the stored values depend on
+def settings_key():
+    import numpy as np
+    import sympy as sp
+
+    import checker
+    settings = (
+        checker.SAMPLE_SEED, checker.SAMPLE_COUNT, checker.SAMPLE_RANGE, checker.RTOL, checker.ATOL,
+        checker.MAX_MAGNITUDE, checker.FINGERPRINT_BITS, checker.DEFINITE_DIGITS, sp.__version__, np.__version__,
+    )
+    return hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
+
+
+# Function to read the cache file; returns ({item key: Artifact}, {value key: value}), both
+# empty if it is missing or stale
+def read(path=ARTIFACTS_PATH):
+    try:
+        with open(path, "rb") as f:
+            stored = pickle.load(f)
+        if stored["settings"] != settings_key():
+            return {}, {}
+        return {key: Artifact._make(item) for key, item in stored["items"].items()}, dict(stored["values"])
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError, AttributeError):
+        return {}, {}
+
+
+def _load():
+    global _artifacts, _values
+    if _artifacts is None:
+        with _lock:
+            if _artifacts is None:
+                _artifacts, _values = read()
+
+
+# Function to look up the stored artifact of an integrand (None if not built yet)
+def get(f_x):
+    _load()
+    return _artifacts.get(item_key(f_x))
+
+
+# Function to look up the stored value of a definite integral (None if not built yet)
+def get_value(definite):
+    _load()
+    return _values.get(value_key(definite))
+
+
+# Function to compute the artifact of one integrand
+def compute(f_x):
+    import checker
+    expr = checker.sp.sympify(f_x)
+    values = checker.evaluate(checker.compile_expr(expr))
+    valid = int((~checker.np.isnan(values)).sum())
+    return Artifact(pickle.dumps(expr), values, valid, checker.fingerprint(values))
+
+
+# Function to compute the value of a definite integral by high-precision quadrature
+# (sp.integrate can take seconds)
+def compute_value(definite):
+    import mpmath
+
+    import checker
+    sp = checker.sp
+    integrand = sp.sympify(definite.integrand)
+    with mpmath.workdps(checker.DEFINITE_DIGITS):
+        bounds = [mpmath.mpmathify(str(sp.sympify(bound).evalf(checker.DEFINITE_DIGITS))) for bound in (definite.lower, definite.upper)]
+        value = mpmath.quad(sp.lambdify(checker.x, integrand, modules="mpmath"), bounds)
+    return float(value)
+
+
+# Function to make sure every integrand and definite integral has an up-to-date entry on
+# disk; entries no longer in the lists are dropped. Returns the number computed.
+def build(integrands, definites=(), path=ARTIFACTS_PATH):
+    global _artifacts, _values
+    stored, stored_values = read(path)
+    items = {}
+    values = {}
+    computed = 0
+    for f_x in integrands:
+        key = item_key(f_x)
+        if key not in stored:
+            stored[key] = compute(f_x)
+            computed += 1
+        items[key] = stored[key]
+    for definite in definites:
+        key = value_key(definite)
+        if key not in stored_values:
+            stored_values[key] = compute_value(definite)
+            computed += 1
+        values[key] = stored_values[key]
+
+    if computed or len(items) != len(stored) or len(values) != len(stored_values) or not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            # Plain tuples, so the file does not depend on where Artifact is defined
+            rows = {key: tuple(item) for key, item in items.items()}
+            pickle.dump({"settings": settings_key(), "items": rows, "values": values}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    with _lock:
+        _artifacts, _values = items, values
+    return computed
+
+
+# Function to bring the cache up to date with the question bank. Returns the number computed.
+def prepare(path=ARTIFACTS_PATH):
+    return build(bank.integrands(), bank.definites(), path)
+
+
+if __name__ == "__main__":
+    computed = prepare()
+    print(f"{len(bank.integrands())} integrands, {len(bank.definites())} definite integrals, {computed} computed, cache at {ARTIFACTS_PATH}", file=sys.stderr)
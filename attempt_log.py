@@ -0,0 +1,225 @@
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+# Write-behind log of every checked answer, for grading and review. The app
+# only puts attempts on a bounded in-memory queue (never waiting on disk); a
+# background thread drains it and inserts batches into a SQLite database in
+# WAL mode, one transaction per batch, when the batch is full or flush_interval
+# has passed. If the writer falls behind and the queue fills up, new attempts
+# are dropped and counted rather than slowing grading down.
+#
+#   python attempt_log.py                    # attempts per question and verdict
+#   python attempt_log.py --benchmark 100000 --rate 5000   # write rate and drops, on a temporary database
+
+# Set MATH22_ATTEMPT_LOG to another file, or to '' to turn the log off
+ATTEMPT_LOG_PATH = os.environ.get(
+    "MATH22_ATTEMPT_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "attempts.sqlite3")
+)
+
+DEFAULT_QUEUE_SIZE = 10000      # attempts waiting to be written before new ones are dropped
+DEFAULT_BATCH_SIZE = 500        # attempts inserted per transaction at most
+DEFAULT_FLUSH_INTERVAL = 0.5    # seconds an attempt may wait for its batch to fill up
+
+# time: when the answer was checked (seconds since the epoch)
+# session: id of the browser session
+# question: question id ("u_sub:1", or "u_sub:random" for a generated exercise)
+# integrand: f(x) of the question
+# answer: the raw text the student submitted
+# verdict, reason, fingerprint: from the grading Result
+# seconds: how long the check took in the app (cache hits included)
+# timings: per-stage seconds of the grading that produced the verdict ({stage: seconds}), or None
+Attempt = namedtuple("Attempt", "time session question integrand answer verdict reason fingerprint seconds timings")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    session TEXT NOT NULL,
+    question TEXT NOT NULL,
+    integrand TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    timings TEXT
+)
+"""
+_STOP = object()  # Queued by close() to stop the writer
+
+_INSERT = f"INSERT INTO attempts ({', '.join(Attempt._fields)}) VALUES ({', '.join('?' * len(Attempt._fields))})"
+
+
+# Function to open the database (creating it if needed) in WAL mode
+def connect(path=ATTEMPT_LOG_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; a crash can only lose the last batches
+    connection.execute(_SCHEMA)
+    connection.commit()
+    return connection
+
+
+def _row(attempt):
+    timings = json.dumps(attempt.timings) if attempt.timings else None
+    return attempt._replace(timings=timings)
+
+
+class AttemptLog:
+    # Bounded queue of attempts drained into SQLite by a background writer thread
+    def __init__(self, path=ATTEMPT_LOG_PATH, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0     # attempts lost to database errors
+        self.batches = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dropped_lock = threading.Lock()
+        self._connection = connect(path)
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="attempt-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # Function to log an attempt without blocking; returns False if the queue was full and it was dropped
+    def record(self, attempt):
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(attempt)
+            return True
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return False
+
+    # Function to wait until every attempt recorded so far is written (or the timeout passes)
+    def flush(self, timeout=None):
+        if not self._writer.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, Attempt):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch full, flush interval over, or a flush/close request
+            if batch:
+                self._insert(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _insert(self, batch):
+        try:
+            with self._connection:
+                self._connection.executemany(_INSERT, [_row(attempt) for attempt in batch])
+            self.written += len(batch)
+            self.batches += 1
+        except sqlite3.Error as error:
+            self.failed += len(batch)
+            print(f"attempt log: {len(batch)} attempts not written: {error}", file=sys.stderr)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    # Function to write what is queued and stop the writer
+    def close(self, timeout=10.0):
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout)
+        if not self._writer.is_alive():
+            self._connection.close()
+
+
+# Function to write count attempts from several threads, paced at rate attempts per second in
+# total (0 for as fast as they come). Returns the log stats, the offered rate and the written rate.
+def benchmark(count, path, rate=0, threads=4):
+    log = AttemptLog(path)
+    attempt = Attempt(0.0, "benchmark", "u_sub:1", "sin(2*x)", "-1/2cos2x", "correct", "ok", "0123456789abcdef",
+                      0.001, {"sympify": 0.0005, "evaluate": 0.0002})
+    per_thread = count // threads
+
+    def produce():
+        began = time.perf_counter()
+        for i in range(per_thread):
+            if rate and i % 100 == 0:
+                time.sleep(max(0.0, began + i * threads / rate - time.perf_counter()))
+            log.record(attempt._replace(time=time.time(), answer=f"-1/2cos2x+{i}"))
+
+    start = time.perf_counter()
+    producers = [threading.Thread(target=produce) for _ in range(threads)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    offered = time.perf_counter() - start
+    log.flush()
+    written = time.perf_counter() - start
+    log.close()
+    stats = log.stats()
+    return stats, per_thread * threads / offered, stats["written"] / written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the attempt log, or benchmark writing to it.")
+    parser.add_argument("--path", default=ATTEMPT_LOG_PATH, help="attempt log database")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="write N attempts to a temporary database and report the rate")
+    parser.add_argument("--rate", type=float, default=0, help="attempts per second offered by --benchmark (default: as fast as possible)")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        with tempfile.TemporaryDirectory() as directory:
+            stats, offered, written = benchmark(args.benchmark, os.path.join(directory, "attempts.sqlite3"), args.rate)
+        print(json.dumps({**stats, "offered_per_second": round(offered), "written_per_second": round(written)}, indent=2))
+        return
+
+    connection = connect(args.path)
+    rows = connection.execute("SELECT question, verdict, COUNT(*) FROM attempts GROUP BY question, verdict ORDER BY question, verdict")
+    for question, verdict, count in rows:
+        print(f"{question:24s} {verdict:10s} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+# Question bank, loaded once at startup from the JSON files in questions/ (one
+# file per topic page):
+#
+#   {"topic": "u_sub", "title": "U-Substitution", "order": 1,
+#    "questions": [{"prompt": "\\int \\sin(2x) \\,dx", "integrand": "sin(2*x)", "answer": "-1/2cos2x"}, ...]}
+#
+# prompt is the integral shown to the student and integrand is f(x); an answer is
+# correct when its derivative equals the integrand. answer is one correct answer
+# (used by the benchmarks), and any other fields are kept as metadata.
+#
+# Definite integrals add their bounds, in SymPy syntax, and take a number as the answer:
+#
+#   {"prompt": "\\int_1^e x\\ln x \\,dx", "integrand": "x*ln(x)", "bounds": ["1", "E"], "answer": "(e^2+1)/4"}
+
+QUESTIONS_DIR = os.environ.get("MATH22_QUESTIONS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions"))
+
+# topic, index: position of the question in its topic page
+# meta: every other field of the question in the file
+Question = namedtuple("Question", "topic index prompt integrand answer meta")
+
+# What a definite integral question is graded against (in place of the integrand string):
+# the integrand f(x) and the bounds, as written in the question file
+Definite = namedtuple("Definite", "integrand lower upper")
+
+
+# Function to read every topic file; returns ({topic: (title, [Question, ...])}, content hash)
+def load(directory=QUESTIONS_DIR):
+    digest = hashlib.sha256()
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            content = f.read()
+        digest.update(name.encode() + b"\0" + content + b"\0")
+        try:
+            documents.append(json.loads(content))
+        except ValueError as error:
+            raise ValueError(f"{name}: {error}") from None
+
+    topics = {}
+    for document in sorted(documents, key=lambda document: (document.get("order", 0), document["topic"])):
+        topic = document["topic"]
+        if topic in topics:
+            raise ValueError(f"topic {topic!r} is defined twice in {directory}")
+        questions = []
+        for index, item in enumerate(document["questions"]):
+            meta = {key: value for key, value in item.items() if key not in ("prompt", "integrand", "answer")}
+            questions.append(Question(topic, index, item["prompt"], item["integrand"], item.get("answer"), meta))
+        topics[topic] = (document.get("title", topic), questions)
+    return topics, digest.hexdigest()[:16]
+
+
+# Function to get what a question's answers are graded against: its integrand, or a Definite
+def target(question):
+    bounds = question.meta.get("bounds")
+    if bounds is None:
+        return question.integrand
+    lower, upper = bounds
+    return Definite(question.integrand, str(lower), str(upper))
+
+
+TOPICS, _VERSION = load()
+
+# For each topic page, a list of (integral shown to the student, integrand f(x) or Definite)
+QUIZ_DATA = {topic: [(q.prompt, target(q)) for q in questions] for topic, (_, questions) in TOPICS.items()}
+
+# Every question by id (see question_id)
+QUESTIONS = {f"{q.topic}:{q.index + 1}": q for _, questions in TOPICS.values() for q in questions}
+
+
+# Function to get the (integral, integrand or Definite) pair of a question
+def get_question(page, index):
+    return QUIZ_DATA[page][index]
+
+
+# Function to get the title of a topic page
+def title(page):
+    return TOPICS[page][0]
+
+
+# Question ids used outside the app (batch grading, the grading service): "<page>:<exercise number>",
+# e.g. "u_sub:1" is the first U-Sub exercise
+def question_id(page, index):
+    return f"{page}:{index + 1}"
+
+
+# Function to turn a question id back into (page, index); raises KeyError for unknown questions
+def parse_question_id(qid):
+    question = QUESTIONS[str(qid)]
+    return question.topic, question.index
+
+
+# Function to get a hash of the question files; it changes whenever a question changes
+def version():
+    return _VERSION
+
+
+# Function to list the distinct integrands in the bank (what the artifact cache is built for)
+def integrands():
+    return sorted({q.integrand for q in QUESTIONS.values() if "bounds" not in q.meta})
+
+
+# Function to list the definite integrals in the bank (their values are stored in the artifact cache)
+def definites():
+    return sorted({target(q) for q in QUESTIONS.values() if "bounds" in q.meta})
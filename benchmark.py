@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import sympy as sp
+
+import bank
+import grading
+import guard
+import metrics
+from checker import definite_value, exact_check, is_equivalent, reference_form, reference_values, sample, x
+
+# Benchmark for the parse -> differentiate -> compare pipeline. Grades every
+# question in the bank with grading.grade, over a corpus of correct, incorrect
+# and adversarial answers (bench_corpus.json), and writes the percentiles of
+# the per-stage timings grade() reports as JSON. Repeats of an answer go through
+# the same caches as in the app (answer classes, precomputed references).
+#
+#   python benchmark.py -o results.json
+#   python benchmark.py --compare baseline.json     # exit code 1 on regressions
+#   python benchmark.py --startup                   # app import time and first-check latency
+#   python benchmark.py --exact                     # exact rational check against the numeric one
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(ROOT, "bench_corpus.json")
+
+STAGES = ("screen", "preprocess", "sympify", "diff", "evaluate", "latex")
+PERCENTILES = (50, 90, 99)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25    # 25% slower than the baseline counts as a regression
+SLOWEST_IMPORTS = 10        # Top-level imports listed in the startup report
+
+
+# Function to time one answer through every stage of grading.grade; returns {stage: seconds}
+def time_answer(answer, f_x):
+    return grading.grade(answer, f_x).timings or {}
+
+
+# Function to summarize a list of durations (seconds) in microseconds
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1e6
+    summary = {"count": len(samples), "mean": round(float(values.mean()), 1)}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(float(np.percentile(values, p)), 1)
+    summary["max"] = round(float(values.max()), 1)
+    return summary
+
+
+def _meta(**extra):
+    return {
+        "python": platform.python_version(),
+        "sympy": sp.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "unit": "microseconds",
+        **extra,
+    }
+
+
+def run(corpus_path=CORPUS_PATH, repeat=DEFAULT_REPEAT):
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+
+    overall = {stage: [] for stage in STAGES}
+    questions = {}
+    for page, items in bank.QUIZ_DATA.items():
+        for index, (_, f_x) in enumerate(items):
+            qid = bank.question_id(page, index)
+            answers = corpus.get(qid)
+            if not answers:
+                print(f"warning: no benchmark answers for {qid}", file=sys.stderr)
+                continue
+            # Computed once per question in the app too (at warm-up); not part of a check
+            if isinstance(f_x, bank.Definite):
+                definite_value(f_x)
+            else:
+                reference_values(f_x)
+
+            per_question = {stage: [] for stage in STAGES}
+            per_kind = {}
+            for kind, kind_answers in answers.items():
+                total = []
+                for _ in range(repeat):
+                    for answer in kind_answers:
+                        timings = time_answer(answer, f_x)
+                        for stage, seconds in timings.items():
+                            per_question[stage].append(seconds)
+                            overall[stage].append(seconds)
+                        total.append(sum(timings.values()))
+                per_kind[kind] = summarize(total)
+            questions[qid] = {"stages": {stage: summarize(s) for stage, s in per_question.items()}, "total": per_kind}
+
+    return {
+        "meta": _meta(repeat=repeat),
+        "stages": {stage: summarize(s) for stage, s in overall.items()},
+        "questions": questions,
+    }
+
+
+# Function to run Python code in a fresh interpreter (from the app directory); returns its stdout and stderr
+def _fresh_python(code, *options):
+    process = subprocess.run([sys.executable, *options, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return process.stdout, process.stderr
+
+
+# Function to import a module in a fresh interpreter with -X importtime. Returns
+# (its cumulative microseconds, {module it imports directly: microseconds}, names of every module imported)
+def import_time(module):
+    _, report = _fresh_python(f"import {module}", "-X", "importtime")
+    lines = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # Nested imports are indented under their parent
+        lines.append((depth, name.strip(), int(cumulative)))
+
+    # A module is reported after everything it imports, so its direct imports are the
+    # entries one level deeper just above it
+    total, direct = 0, {}
+    for position, (depth, name, cumulative) in enumerate(lines):
+        if name == module and depth == 0:
+            total = cumulative
+            for child_depth, child, child_cumulative in reversed(lines[:position]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    direct[child] = child_cumulative
+    return total, direct, {name for _, name, _ in lines}
+
+
+# Function to parse and differentiate an answer like grading.grade does; None if it is rejected or unreadable
+def _derivative(answer):
+    if not guard.screen(answer).ok:
+        return None
+    try:
+        return sp.diff(grading.without_abs(grading.parse(answer, metrics.Stopwatch())), x)
+    except Exception:
+        return None
+
+
+# Function to time the exact rational check against the numeric one (sample + compare) on every
+# corpus answer where both the integrand and the answer's derivative are rational functions.
+# Answers exact_check declines (above checker.MAX_RATIONAL_DEGREE) are timed on the numeric
+# check they get instead. Also lists answers where the two checks disagree.
+def exact_speedup(corpus_path=CORPUS_PATH, repeat=DEFAULT_REPEAT):
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+
+    overall = {"exact": [], "numeric": []}
+    questions = {}
+    disagreements = []
+    for page, items in bank.QUIZ_DATA.items():
+        for index, (_, f_x) in enumerate(items):
+            qid = bank.question_id(page, index)
+            if isinstance(f_x, bank.Definite) or reference_form(f_x) is None:
+                continue  # Not a rational integrand: always checked numerically
+            reference_values(f_x)
+            timings = {"exact": [], "numeric": []}
+            for answer in (a for kind_answers in corpus.get(qid, {}).values() for a in kind_answers):
+                g_x = _derivative(answer)
+                if g_x is None or g_x.has(sp.Float) or not g_x.is_rational_function(x):
+                    continue
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    checked = exact_check(f_x, g_x)
+                    exact = checked[0] if checked is not None else is_equivalent(f_x, g_x, sample(g_x))
+                    timings["exact"].append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    numeric = is_equivalent(f_x, g_x, sample(g_x))
+                    timings["numeric"].append(time.perf_counter() - start)
+                if exact != numeric:
+                    disagreements.append({"question": qid, "answer": answer, "exact": exact, "numeric": numeric})
+            if timings["exact"]:
+                for method, samples in timings.items():
+                    overall[method].extend(samples)
+                questions[qid] = {method: summarize(samples) for method, samples in timings.items()}
+
+    results = {method: summarize(samples) for method, samples in overall.items()}
+    if overall["exact"]:
+        results["speedup_p50"] = round(results["numeric"]["p50"] / results["exact"]["p50"], 2)
+    return {"meta": _meta(repeat=repeat), "exact": results, "questions": questions, "disagreements": disagreements}
+
+
+# Function to measure cold start: importing the app, importing SymPy, and the first
+# check in a fresh process (what the background warm-up hides) against a warm one
+def startup():
+    app_total, app_imports, app_modules = import_time("test")
+    sympy_total, _, _ = import_time("sympy")
+    code = (
+        "import time, grading\n"
+        "start = time.perf_counter(); grading.grade('x**2', '2*x'); cold = time.perf_counter() - start\n"
+        "start = time.perf_counter(); grading.grade('x**3', '3*x**2'); warm = time.perf_counter() - start\n"
+        "print(cold, warm)"
+    )
+    cold, warm = (float(value) for value in _fresh_python(code)[0].split())
+    slowest = sorted(app_imports.items(), key=lambda item: -item[1])[:SLOWEST_IMPORTS]
+    return {
+        "app_import": app_total,
+        "sympy_loaded_by_app_import": "sympy" in app_modules,
+        "sympy_import": sympy_total,
+        "first_check_cold": round(cold * 1e6, 1),
+        "first_check_warm": round(warm * 1e6, 1),
+        "slowest_app_imports": dict(slowest),
+    }
+
+
+# Function to list stage percentiles that got slower than the baseline by more than threshold
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for key in ("app_import", "first_check_cold"):
+        new, old = results.get("startup", {}).get(key), baseline.get("startup", {}).get(key)
+        if new and old and new / old - 1 > threshold:
+            regressions.append(("startup", key, old, new, new / old - 1))
+    for stage, summary in results.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage, {})
+        for p in PERCENTILES:
+            key = f"p{p}"
+            if key in summary and old.get(key):
+                change = summary[key] / old[key] - 1
+                if change > threshold:
+                    regressions.append((stage, key, old[key], summary[key], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the parse -> differentiate -> compare pipeline.")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="answers to benchmark, per question id")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="times each answer is graded")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--startup", action="store_true", help="measure import time and first-check latency instead")
+    parser.add_argument("--exact", action="store_true", help="time the exact rational check against the numeric one instead")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        results = {"meta": _meta(), "startup": startup()}
+    elif args.exact:
+        results = exact_speedup(args.corpus, args.repeat)
+    else:
+        results = run(args.corpus, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for stage, key, old, new, change in regressions:
+            print(f"REGRESSION {stage} {key}: {old:.1f}us -> {new:.1f}us (+{change:.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+
+# Process-wide cache of graded answers, shared by every Streamlit session.
+# During a lecture many students submit exactly the same string for the same
+# question, so a hit skips parse -> diff -> evaluate entirely.
+
+DEFAULT_MAXSIZE = 10000
+
+
+# Function to build the cache key of a submission
+def make_key(page, question_index, answer):
+    return (page, question_index, "".join(answer.split()))
+
+
+class VerdictCache:
+    # Size-bounded LRU cache; safe to use from several threads
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Hook for question bank changes: clears the cache when the bank version differs
+    # from the last one seen. Returns True if it was cleared.
+    def watch(self, version):
+        with self._lock:
+            if version == self.version:
+                return False
+            self._entries.clear()
+            self.version = version
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class AnswerClasses:
+    # Distinct answer equivalence classes (derivative fingerprints) seen per question
+    def __init__(self, max_per_question=DEFAULT_MAXSIZE):
+        self.max_per_question = max_per_question
+        self._classes = {}
+        self._lock = threading.Lock()
+
+    def record(self, page, question_index, fingerprint):
+        if not fingerprint:
+            return
+        with self._lock:
+            seen = self._classes.setdefault((page, question_index), set())
+            if len(seen) < self.max_per_question:
+                seen.add(fingerprint)
+
+    def clear(self):
+        with self._lock:
+            self._classes.clear()
+
+    # Number of distinct classes per (page, question_index)
+    def counts(self):
+        with self._lock:
+            return {key: len(seen) for key, seen in self._classes.items()}
+
+
+# The shared caches used by the app
+verdicts = VerdictCache()
+answer_classes = AnswerClasses()
@@ -0,0 +1,218 @@
+import functools
+import hashlib
+import pickle
+
+import numpy as np
+import sympy as sp
+from sympy.polys.polyerrors import CoercionFailed
+
+import artifacts
+
+# Variable used by every integrand and answer
+x = sp.symbols('x')
+
+# Sample points used to test equivalence. They are drawn once from a seeded
+# generator so every check (and every process) uses the same points, and they
+# cover both sides of zero so integrands like sqrt(x-1) or ln(x) still have
+# plenty of valid points inside their domain.
+SAMPLE_SEED = 22
+SAMPLE_COUNT = 64
+SAMPLE_RANGE = (-10.0, 10.0)
+SAMPLE_POINTS = np.sort(np.random.default_rng(SAMPLE_SEED).uniform(*SAMPLE_RANGE, SAMPLE_COUNT))
+
+# Tolerances for comparing the two sides at each sample point
+RTOL = 1e-6
+ATOL = 1e-9
+
+# Values above this are treated as undefined (poles, overflow), since float
+# round-off there is bigger than any sensible tolerance
+MAX_MAGNITUDE = 1e8
+
+# Fewer valid points than this and the numeric check is not trusted
+MIN_VALID_POINTS = 8
+
+
+# Function to turn an expression of x into a NumPy function evaluated over a whole array at once
+def compile_expr(expr):
+    return sp.lambdify(x, expr, modules="numpy")
+
+
+# Function to evaluate a compiled expression at the sample points, marking undefined values as nan
+def evaluate(func, points=SAMPLE_POINTS):
+    with np.errstate(all="ignore"):
+        values = np.asarray(func(points), dtype=complex)
+    # Constant expressions come back as a single value
+    values = np.broadcast_to(values, points.shape)
+    # Only keep values that are real and finite; the integrand is a real function
+    real = np.abs(values.imag) <= ATOL + RTOL * np.abs(values.real)
+    valid = real & np.isfinite(values.real) & (np.abs(values.real) < MAX_MAGNITUDE)
+    return np.where(valid, values.real, np.nan)
+
+
+# Reference integrands are the same for every student: their parsed form, values and
+# fingerprint come from the on-disk artifact cache, or are computed once per process
+@functools.lru_cache(maxsize=4096)
+def reference(f_x):
+    stored = artifacts.get(f_x) if isinstance(f_x, str) else None
+    return stored or artifacts.compute(f_x)
+
+
+def reference_values(f_x):
+    return reference(f_x).values
+
+
+# Function to evaluate g_x (derivative of the answer) at the sample points.
+# Returns None if it cannot be evaluated numerically.
+def sample(g_x):
+    # Anything still depending on another symbol (other than the constant C, which
+    # disappears after differentiating) cannot be evaluated
+    if g_x.free_symbols - {x}:
+        return None
+    try:
+        return evaluate(compile_expr(g_x))
+    except Exception:
+        # Functions NumPy cannot evaluate
+        return None
+
+
+# Function to check whether g_x (derivative of the answer) matches the integrand f_x.
+# user_vals are the values from sample(g_x), if already computed.
+def is_equivalent(f_x, g_x, user_vals=None):
+    if g_x.free_symbols - {x}:
+        return False
+
+    correct_vals = reference_values(f_x)
+    if user_vals is None:
+        user_vals = sample(g_x)
+    if user_vals is None:
+        # NumPy cannot evaluate it: compare point by point in high precision
+        return _precise_equal(f_x, g_x)
+
+    # Skip points where either side is undefined
+    both = ~np.isnan(correct_vals) & ~np.isnan(user_vals)
+    if both.sum() < MIN_VALID_POINTS:
+        if reference(f_x).valid >= MIN_VALID_POINTS:
+            # The integrand is defined there but the answer's derivative is not (or is huge): wrong
+            return False
+        return _precise_equal(f_x, g_x)
+
+    return bool(np.allclose(user_vals[both], correct_vals[both], rtol=RTOL, atol=ATOL))
+
+
+# Rational functions of x with rational coefficients (polynomials, partial fractions, derivatives
+# of logs of them) are compared exactly in SymPy's sparse fraction field QQ(x), where each side
+# is reduced to lowest terms: equivalent answers have the same reduced form.
+RATIONAL_FIELD = sp.QQ.frac_field(x)
+
+# Above this degree bound, converting to RATIONAL_FIELD (which expands everything) is slower than
+# the numeric check: (x+1)^1000*(x+2)^1000 takes seconds to expand and milliseconds to sample
+MAX_RATIONAL_DEGREE = 32
+
+
+# Function to bound the degree of a rational function of x without expanding it (an upper bound
+# on the degrees of numerator and denominator together, over a common denominator)
+def rational_degree(expr):
+    if not expr.has(x):
+        return 0
+    if expr.is_Symbol:
+        return 1
+    if expr.is_Pow and expr.exp.is_Integer:
+        return abs(int(expr.exp)) * rational_degree(expr.base)
+    return sum(rational_degree(arg) for arg in expr.args)
+
+
+# Function to convert expr to a reduced element of RATIONAL_FIELD. Returns None if it is not a
+# rational function of x with exact rational coefficients (floats, pi, sqrt(2), sin(x), ...)
+# or its degree is above MAX_RATIONAL_DEGREE.
+def rational_form(expr):
+    if expr.has(sp.Float) or expr.free_symbols - {x} or not expr.is_rational_function(x):
+        return None
+    if rational_degree(expr) > MAX_RATIONAL_DEGREE:
+        return None
+    try:
+        return RATIONAL_FIELD.from_sympy(expr)
+    except (ValueError, CoercionFailed):
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def reference_form(f_x):
+    return rational_form(pickle.loads(reference(f_x).expr))
+
+
+# Function to decide exactly whether g_x equals f_x when both are rational functions.
+# Returns (equal, fingerprint of g_x's reduced form), or None to use the numeric check.
+def exact_check(f_x, g_x):
+    reference_rational = reference_form(f_x)
+    if reference_rational is None:
+        return None
+    answer = rational_form(g_x)
+    if answer is None:
+        return None
+    digest = hashlib.blake2b(f"{answer.numer}/{answer.denom}".encode(), digest_size=8, person=b"rational")
+    return answer == reference_rational, digest.hexdigest()
+
+
+# Definite integrals are graded on their value: the reference comes from the on-disk artifact
+# cache (high-precision quadrature, computed once per process if it is not stored), and the
+# closed-form answer is evaluated once and compared with a relative tolerance.
+DEFINITE_DIGITS = 30
+DEFINITE_RTOL = 1e-9
+
+# Function to get the value of a definite integral (a bank.Definite)
+@functools.lru_cache(maxsize=1024)
+def definite_value(definite):
+    stored = artifacts.get_value(definite)
+    return stored if stored is not None else artifacts.compute_value(definite)
+
+
+# Function to compare a closed-form answer with the value of a definite integral.
+# Returns (equal, fingerprint of the answer's value); answers that are not a real number are not equal.
+def definite_check(definite, expr):
+    if expr.free_symbols:
+        return False, ''
+    value = complex(expr.evalf(DEFINITE_DIGITS))
+    if not np.isfinite(value.real) or abs(value.imag) > ATOL:
+        return False, ''
+    reference_value = definite_value(definite)
+    equal = abs(value.real - reference_value) <= ATOL + DEFINITE_RTOL * abs(reference_value)
+    return equal, fingerprint(np.array([value.real]))
+
+
+# Number of significant bits kept when quantizing values for a fingerprint (about 6 digits)
+FINGERPRINT_BITS = 20
+
+
+# Function to reduce sampled values to a short hash. Equivalent answers (-cos(2x)/2 and
+# -0.5cos2x+7) have the same derivative values, so they share a fingerprint.
+def fingerprint(values):
+    undefined = np.isnan(values)
+    mantissa, exponent = np.frexp(np.where(undefined, 0.0, values))
+    quantized = np.round(mantissa * 2 ** FINGERPRINT_BITS).astype(np.int64)
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(undefined.tobytes())
+    digest.update(quantized.tobytes())
+    digest.update(np.where(quantized == 0, 0, exponent).astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+
+# Digits used by the fallback comparison (enough for values far beyond MAX_MAGNITUDE)
+PRECISE_DIGITS = 30
+
+
+# Slow fallback for the rare case where sampling is not conclusive: evaluates both sides at
+# the sample points with evalf, so its cost is bounded (sp.simplify could run for minutes)
+def _precise_equal(f_x, g_x):
+    f_x_expr = pickle.loads(reference(f_x).expr)
+    valid = 0
+    for point in SAMPLE_POINTS:
+        point = sp.Float(point, PRECISE_DIGITS)
+        expected = f_x_expr.evalf(PRECISE_DIGITS, subs={x: point})
+        actual = g_x.evalf(PRECISE_DIGITS, subs={x: point})
+        # SymPy numbers, so values far beyond float range still compare
+        if not (expected.is_number and actual.is_number and expected.is_finite and actual.is_finite):
+            continue  # Undefined at this point
+        if abs(actual - expected) > ATOL + RTOL * abs(expected):
+            return False
+        valid += 1
+    return valid >= MIN_VALID_POINTS
@@ -0,0 +1,147 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+
+import grading
+import guard
+import symbolic
+
+try:
+    import resource  # Not available on Windows; memory caps are skipped there
+except ImportError:
+    resource = None
+
+# Grading runs in separate worker processes so one pathological answer
+# (9**9**9**9, x**(10**8), ...) cannot pin the Streamlit process. Each check
+# has a wall-clock timeout, each worker has a memory ceiling, and a worker that
+# hangs or dies is killed and replaced by a fresh one. The workers run
+# grading.grade by default; another task (a module-level function, such as the
+# answer preview's parse) can be given instead.
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_TIMEOUT = 5.0                       # seconds per check
+DEFAULT_MEMORY_LIMIT = 1024 * 1024 * 1024   # bytes of address space per worker
+
+# Status of a task run in a worker
+DONE = "done"
+FAILED = "failed"           # the task raised, or the worker died (e.g. it hit the memory ceiling)
+TIMED_OUT = "timed_out"     # the worker was killed after the timeout
+
+
+# Function to cap the address space of the current process
+def limit_memory(memory_limit):
+    if resource is None or not memory_limit:
+        return
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ValueError, OSError):
+        pass
+
+
+# Main loop of a worker process: receive the task's arguments, send back (status, value)
+def _worker_main(conn, memory_limit, task):
+    limit_memory(memory_limit)
+    # Warm up SymPy, the lexer and lambdify before the first real check
+    symbolic.warm_up()
+    while True:
+        try:
+            args = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            reply = (DONE, task(*args))
+        except Exception:
+            # MemoryError, or a SymPy error the task did not expect: the worker lives on
+            reply = (FAILED, None)
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            break
+        except Exception:
+            conn.send((FAILED, None))  # The value could not be pickled
+
+
+class _Worker:
+    def __init__(self, context, memory_limit, task):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit, task), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+
+class GradingExecutor:
+    # Pool of warm worker processes; grade() and run() block until a worker is free
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 task=grading.grade):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.task = task
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+        atexit.register(self.shutdown)
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.memory_limit, self.task)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        with self._lock:
+            self._workers.remove(worker)
+            self.restarts += 1
+        worker.kill()
+        return self._spawn()
+
+    # Function to run the task in a worker, giving up after the timeout; returns (status, value)
+    def run(self, *args):
+        worker = self._idle.get()
+        try:
+            worker.conn.send(args)
+            if worker.conn.poll(self.timeout):
+                return worker.conn.recv()
+            # Hung worker: kill it and start a fresh one in its place
+            worker = self._replace(worker)
+            return TIMED_OUT, None
+        except (EOFError, OSError):
+            # The worker died (e.g. it hit the memory ceiling)
+            worker = self._replace(worker)
+            return FAILED, None
+        finally:
+            self._idle.put(worker)
+
+    # Function to grade an answer in a worker, giving up after the timeout
+    def grade(self, answer, f_x):
+        # Pathological inputs are rejected here, without waiting for a worker
+        screen = guard.screen(answer)
+        if not screen.ok:
+            return grading.rejected(screen)
+
+        status, result = self.run(answer, f_x)
+        if status == TIMED_OUT:
+            return grading.Result(grading.TIMEOUT, '')
+        if status == FAILED:
+            return grading.Result(grading.ERROR, '')
+        return result
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.kill()
@@ -0,0 +1,329 @@
+import argparse
+import atexit
+import json
+import multiprocessing
+import queue
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter, deque, namedtuple
+
+from executor import DEFAULT_MEMORY_LIMIT, limit_memory
+
+# Randomized exercises for the quiz topics. Each template draws coefficients
+# and builds an integrand; a candidate is kept only if SymPy can integrate it,
+# the antiderivative differentiates back to the integrand, the integrand is
+# defined at enough sample points, and the antiderivative passes the app's own
+# grading. sp.integrate can take seconds, so generation runs in background
+# worker processes that keep a small ready queue per topic, and the quiz only
+# ever pops an already verified exercise. A worker process that dies is
+# replaced, and the candidates it was given are requested again.
+#
+#   python generator.py -n 10         # generate 10 exercises per topic and print the report
+
+DEFAULT_QUEUE_SIZE = 8      # verified exercises kept ready per topic
+DEFAULT_WORKERS = 1         # generation is background work; leave the cores to grading
+DEFAULT_TIMEOUT = 10.0      # seconds allowed to integrate and verify one candidate
+TIMING_WINDOW = 1000        # generation times kept per topic for the report
+CHECK_INTERVAL = 1.0        # seconds between checks that the worker processes are alive
+
+# prompt: the integral shown to the student (LaTeX)
+# integrand: f(x), in the same syntax as the question bank
+# answer: a verified antiderivative, in the syntax students type
+# template: name of the template it came from
+Exercise = namedtuple("Exercise", "topic prompt integrand answer template")
+
+# Reasons a candidate is thrown away
+TIMEOUT = "timeout"
+UNEVALUATED = "unevaluated"     # sp.integrate gave up
+UNVERIFIED = "unverified"       # the antiderivative does not differentiate back to the integrand
+DOMAIN = "domain"               # integrand undefined at too many sample points
+UNGRADABLE = "ungradable"       # the app does not accept the antiderivative as an answer
+DUPLICATE = "duplicate"         # same integrand already waiting in the queue
+DIED = "died"                   # the worker process died before sending it back
+ERROR = "error"
+
+
+# Templates: each draws coefficients and returns an integrand
+
+def _u_sub_power(rng):
+    return f"x*({rng.randint(1, 5)}*x^2+{rng.randint(1, 9)})^{rng.randint(2, 6)}"
+
+
+def _u_sub_cos(rng):
+    k = rng.randint(2, 3)
+    return f"x^{k - 1}*cos({rng.randint(1, 5)}*x^{k})"
+
+
+def _u_sub_exp(rng):
+    a = rng.randint(1, 4)
+    return f"exp({a}*x)/(exp({a}*x)+{rng.randint(1, 9)})"
+
+
+def _ibp_log(rng):
+    return f"x^{rng.randint(1, 6)}*ln(x)"
+
+
+def _ibp_exp(rng):
+    return f"x^{rng.randint(1, 3)}*exp({rng.choice((-3, -2, -1, 1, 2, 3))}*x)"
+
+
+def _ibp_trig(rng):
+    return f"x*{rng.choice(('sin', 'cos'))}({rng.randint(2, 6)}*x)"
+
+
+def _trig_sin_cos(rng):
+    # One odd power, so it is a u-sub after the Pythagorean identity
+    odd, even = rng.choice((1, 3, 5)), rng.choice((0, 2, 4))
+    a, b = (odd, even) if rng.random() < 0.5 else (even, odd)
+    return f"(sin(x))^{a}*(cos(x))^{b}"
+
+
+def _trig_tan_sec(rng):
+    return f"(tan(x))^{rng.randint(2, 6)}*(sec(x))^2"
+
+
+def _trig_square(rng):
+    return f"({rng.choice(('sin', 'cos'))}({rng.randint(2, 5)}*x))^2"
+
+
+TEMPLATES = {
+    "u_sub": {"x(ax^2+b)^n": _u_sub_power, "x^(k-1)cos(ax^k)": _u_sub_cos, "e^(ax)/(e^(ax)+b)": _u_sub_exp},
+    "ibp": {"x^n ln x": _ibp_log, "x^n e^(ax)": _ibp_exp, "x sin(ax)": _ibp_trig},
+    "trig": {"sin^a x cos^b x": _trig_sin_cos, "tan^n x sec^2 x": _trig_tan_sec, "sin^2(ax)": _trig_square},
+}
+
+
+class _Timeout(BaseException):
+    # BaseException, so SymPy's own "except Exception" blocks cannot swallow it
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise _Timeout()
+
+
+# Function to generate and verify one candidate; returns (Exercise or None, rejection reason)
+def generate(topic, rng, timeout=DEFAULT_TIMEOUT):
+    import checker
+    import grading
+    from symbolic import sp
+
+    template = rng.choice(sorted(TEMPLATES[topic]))
+    integrand = TEMPLATES[topic][template](rng)
+    alarm = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        f_x = sp.sympify(integrand)
+        integrand = str(f_x)  # Canonical form (x^1*cos(1*x^2) -> x*cos(x**2)), so duplicates are spotted
+        antiderivative = sp.integrate(f_x, checker.x)
+        if antiderivative.has(sp.Integral):
+            return None, UNEVALUATED
+        if sp.simplify(sp.diff(antiderivative, checker.x) - f_x) != 0:
+            return None, UNVERIFIED
+        if checker.reference(integrand).valid < checker.MIN_VALID_POINTS:
+            return None, DOMAIN
+        answer = str(antiderivative).replace("**", "^").replace("log(", "ln(")
+        if grading.grade(answer, integrand).verdict != grading.CORRECT:
+            return None, UNGRADABLE
+    except _Timeout:
+        return None, TIMEOUT
+    except Exception:
+        return None, ERROR
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    prompt = r"\int " + grading.render_latex(f_x) + r" \,dx"
+    return Exercise(topic, prompt, integrand, answer, template), ""
+
+
+# Main loop of a generator process: receive (topic, seed), send back (worker, topic, Exercise, reason, seconds)
+def _worker_main(worker, tasks, results, timeout, memory_limit):
+    import symbolic
+    limit_memory(memory_limit)
+    symbolic.warm_up()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        topic, seed = task
+        start = time.perf_counter()
+        exercise, reason = generate(topic, random.Random(seed), timeout)
+        results.put((worker, topic, exercise, reason, time.perf_counter() - start))
+
+
+class _Worker:
+    # A generator process with its own task queue, so the tasks it loses when it dies are known
+    def __init__(self, context, number, results, timeout, memory_limit):
+        self.number = number
+        self.tasks = context.Queue()
+        self.outstanding = deque()  # topics of the tasks sent and not answered yet, oldest first
+        self.process = context.Process(target=_worker_main, args=(number, self.tasks, results, timeout, memory_limit),
+                                       daemon=True)
+        self.process.start()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.tasks.cancel_join_thread()
+
+
+class _TopicStats:
+    def __init__(self):
+        self.generated = 0
+        self.rejected = Counter()
+        self.times = deque(maxlen=TIMING_WINDOW)
+
+
+class ExerciseGenerator:
+    # Background pool that keeps up to queue_size verified exercises ready per topic
+    def __init__(self, topics=tuple(TEMPLATES), queue_size=DEFAULT_QUEUE_SIZE, workers=DEFAULT_WORKERS,
+                 timeout=DEFAULT_TIMEOUT, memory_limit=DEFAULT_MEMORY_LIMIT, seed=None):
+        self.queue_size = queue_size
+        self._rng = random.Random(seed)
+        self._ready = {topic: deque() for topic in topics}
+        self._pending = {topic: 0 for topic in topics}
+        self._stats = {topic: _TopicStats() for topic in topics}
+        self._lock = threading.Condition()
+        self._closed = False
+        self.restarts = 0
+
+        self._context = multiprocessing.get_context("spawn")
+        self._timeout = timeout
+        self._memory_limit = memory_limit
+        self._results = self._context.Queue()
+        self._spawned = 0
+        self._workers = [self._spawn() for _ in range(workers)]
+        threading.Thread(target=self._collect, name="exercise-collector", daemon=True).start()
+        with self._lock:
+            for topic in self._ready:
+                self._refill(topic)
+        atexit.register(self.shutdown)
+
+    def _spawn(self):
+        self._spawned += 1
+        return _Worker(self._context, self._spawned, self._results, self._timeout, self._memory_limit)
+
+    # Function to queue enough generation tasks to fill a topic, on the least busy workers (call with the lock held)
+    def _refill(self, topic):
+        while not self._closed and len(self._ready[topic]) + self._pending[topic] < self.queue_size:
+            self._pending[topic] += 1
+            worker = min(self._workers, key=lambda item: len(item.outstanding))
+            worker.outstanding.append(topic)
+            worker.tasks.put((topic, self._rng.getrandbits(64)))
+
+    # Function to replace dead workers; their unanswered tasks count as rejected and are queued
+    # again (call with the lock held)
+    def _replace_dead(self):
+        for i, worker in enumerate(self._workers):
+            if worker.process.is_alive():
+                continue
+            worker.kill()
+            self.restarts += 1
+            for topic in worker.outstanding:
+                self._pending[topic] -= 1
+                self._stats[topic].rejected[DIED] += 1
+            self._workers[i] = self._spawn()
+            for topic in set(worker.outstanding):
+                self._refill(topic)
+
+    def _collect(self):
+        while True:
+            try:
+                number, topic, exercise, reason, seconds = self._results.get(timeout=CHECK_INTERVAL)
+            except queue.Empty:
+                number = None
+            except (EOFError, OSError, ValueError):
+                return
+            with self._lock:
+                if self._closed:
+                    return
+                self._replace_dead()
+                worker = next((item for item in self._workers if item.number == number), None)
+                if worker is None:
+                    continue  # Nothing came, or it came from a worker already replaced (its tasks were requested again)
+                worker.outstanding.popleft()
+                self._pending[topic] -= 1
+                stats = self._stats[topic]
+                stats.times.append(seconds)
+                if exercise is not None and any(item.integrand == exercise.integrand for item in self._ready[topic]):
+                    exercise, reason = None, DUPLICATE
+                if exercise is None:
+                    stats.rejected[reason] += 1
+                else:
+                    stats.generated += 1
+                    self._ready[topic].append(exercise)
+                    self._lock.notify_all()
+                self._refill(topic)
+
+    # Function to take a verified exercise for a topic; None if none is ready yet (never blocks)
+    def pop(self, topic):
+        with self._lock:
+            ready = self._ready.get(topic)
+            if not ready:
+                return None
+            exercise = ready.popleft()
+            self._refill(topic)
+            return exercise
+
+    # Function to wait until every topic has at least count exercises ready (or the timeout passes)
+    def wait_ready(self, count=1, timeout=None):
+        with self._lock:
+            return self._lock.wait_for(lambda: all(len(ready) >= count for ready in self._ready.values()), timeout)
+
+    # Function to report, per topic, how many candidates were kept or rejected (and why) and how long they took
+    def report(self):
+        rows = []
+        with self._lock:
+            for topic, stats in self._stats.items():
+                attempts = stats.generated + sum(stats.rejected.values())
+                times = sorted(stats.times)
+                rows.append({
+                    "topic": topic,
+                    "ready": len(self._ready[topic]),
+                    "generated": stats.generated,
+                    "rejected": sum(stats.rejected.values()),
+                    "rejection_rate": round(sum(stats.rejected.values()) / attempts, 3) if attempts else 0.0,
+                    "mean_seconds": round(sum(times) / len(times), 3) if times else None,
+                    "p90_seconds": round(times[int(0.9 * (len(times) - 1))], 3) if times else None,
+                    "reasons": dict(stats.rejected),
+                })
+        return rows
+
+    def shutdown(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for worker in self._workers:
+            worker.kill()
+        self._results.cancel_join_thread()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate randomized exercises and report generation time and rejection rate.")
+    parser.add_argument("-n", "--count", type=int, default=DEFAULT_QUEUE_SIZE, help="verified exercises to generate per topic")
+    parser.add_argument("-j", "--workers", type=int, default=2, help="generator processes")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds allowed per candidate")
+    parser.add_argument("--seed", type=int, help="seed, for a reproducible run")
+    parser.add_argument("--show", action="store_true", help="also print the exercises")
+    args = parser.parse_args(argv)
+
+    generator = ExerciseGenerator(queue_size=args.count, workers=args.workers, timeout=args.timeout, seed=args.seed)
+    start = time.monotonic()
+    generator.wait_ready(args.count)
+    print(f"{args.count} exercises per topic in {time.monotonic() - start:.1f}s", file=sys.stderr)
+    print(json.dumps(generator.report(), indent=2))
+    generator.shutdown()
+    if args.show:
+        for topic in TEMPLATES:
+            for _ in range(args.count):
+                print(json.dumps(generator.pop(topic)._asdict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import artifacts
+import bank
+import cache
+import grading
+from executor import DEFAULT_TIMEOUT, GradingExecutor
+
+# Offline batch grading. Streams a CSV or JSONL export of (question, answer)
+# records through the same grading pipeline as the app, in parallel on all
+# cores, and writes one JSON verdict per line as records complete (in input
+# order). A checkpoint file next to the output allows resuming after an
+# interruption.
+#
+#   python grade_batch.py answers.csv -o verdicts.jsonl
+#   python grade_batch.py answers.jsonl -o verdicts.jsonl --resume
+#
+# Each record needs a "question" id such as "u_sub:1" (first U-Sub exercise)
+# and an "answer"; any other fields are copied to the output.
+
+CHECKPOINT_EVERY = 500      # records between checkpoints
+REPORT_EVERY = 5.0          # seconds between throughput reports
+
+
+# Function to read records lazily from a CSV (with header) or JSONL file
+def read_records(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# Function to grade one record; returns the output record
+def grade_record(executor, verdicts, record):
+    output = dict(record)
+    try:
+        page, index = bank.parse_question_id(record.get("question"))
+    except KeyError:
+        output["verdict"] = "unknown_question"
+        return output
+
+    answer = record.get("answer") or ""
+    key = cache.make_key(page, index, answer)
+    result = verdicts.get(key)
+    if result is None:
+        result = executor.grade(answer, bank.get_question(page, index)[1])
+        if result.verdict not in grading.UNCACHED:
+            verdicts.put(key, result)
+
+    output["verdict"] = result.verdict
+    if result.verdict == grading.REJECTED:
+        output["reason"] = result.reason
+    return output
+
+
+def _checkpoint_path(output_path):
+    return output_path + ".checkpoint"
+
+
+# Function to read the checkpoint: (records done, output size in bytes at that point)
+def load_checkpoint(output_path):
+    try:
+        with open(_checkpoint_path(output_path)) as f:
+            checkpoint = json.load(f)
+        return checkpoint["records"], checkpoint["offset"]
+    except (OSError, ValueError, KeyError):
+        return 0, 0
+
+
+# Function to save the checkpoint atomically
+def save_checkpoint(output_path, records, offset):
+    path = _checkpoint_path(output_path)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"records": records, "offset": offset}, f)
+    os.replace(path + ".tmp", path)
+
+
+def run(input_path, output_path, workers, timeout, resume=False):
+    done, offset = load_checkpoint(output_path) if resume else (0, 0)
+
+    # Drop anything written after the last checkpoint, then append
+    output = open(output_path, "r+b" if resume and os.path.exists(output_path) else "wb")
+    output.truncate(offset)
+    output.seek(offset)
+
+    artifacts.prepare()
+    executor = GradingExecutor(workers=workers, timeout=timeout)
+    verdicts = cache.VerdictCache()
+    window = deque()  # futures in input order; bounded so memory stays flat
+    max_window = workers * 8
+
+    skip = done
+    start = last_report = time.monotonic()
+    graded = 0
+
+    def write_next():
+        nonlocal done, graded
+        record = window.popleft().result()
+        output.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        done += 1
+        graded += 1
+        if done % CHECKPOINT_EVERY == 0:
+            output.flush()
+            save_checkpoint(output_path, done, output.tell())
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            for number, record in enumerate(read_records(input_path)):
+                if number < skip:
+                    continue  # Already graded before the interruption
+                window.append(threads.submit(grade_record, executor, verdicts, record))
+                while len(window) >= max_window or (window and window[0].done()):
+                    write_next()
+
+                now = time.monotonic()
+                if now - last_report >= REPORT_EVERY:
+                    report(graded, now - start)
+                    last_report = now
+            while window:
+                write_next()
+    finally:
+        output.flush()
+        save_checkpoint(output_path, done, output.tell())
+        output.close()
+        executor.shutdown()
+
+    elapsed = time.monotonic() - start
+    report(graded, elapsed)
+    return graded, elapsed
+
+
+# Function to print throughput to stderr
+def report(graded, elapsed):
+    rate = graded / elapsed if elapsed > 0 else 0.0
+    print(f"{graded} submissions in {elapsed:.1f}s ({rate:.1f} submissions/sec)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a CSV/JSONL export of (question, answer) records.")
+    parser.add_argument("input", help="CSV file with a header, or JSONL file")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to write verdicts to")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="grading processes (default: all cores)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds allowed per answer")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    args = parser.parse_args(argv)
+    run(args.input, args.output, args.workers, args.timeout, args.resume)
+
+
+if __name__ == "__main__":
+    main()
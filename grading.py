@@ -0,0 +1,155 @@
+import re
+from collections import namedtuple
+
+import guard  # Cheap complexity pre-screen, run before sympify
+from bank import Definite  # Definite integral questions are graded on their value
+import metrics  # Per-stage timings of each check
+from cache import VerdictCache
+from lexer import preprocess_input  # Single-pass lexer that makes implied multiplication explicit
+from symbolic import checker, sp  # SymPy and the vectorized equivalence check, imported on first use
+
+# Possible verdicts for a submitted answer
+CORRECT = "correct"
+INCORRECT = "incorrect"
+INVALID = "invalid"
+TIMEOUT = "timeout"
+REJECTED = "rejected"  # Stopped by the complexity pre-screen; the reason code says why
+UNAVAILABLE = "unavailable"  # The grading service could not be reached or answered with an error
+ERROR = "error"  # The grading worker died (e.g. at its memory ceiling) or the check raised
+
+# Feedback shown to the student for each verdict
+FEEDBACK = {
+    CORRECT: "✅ Correct!",
+    INCORRECT: "❌ Incorrect. Try again!",
+    INVALID: "⚠️ Invalid input. Please enter a valid mathematical expression.",
+    TIMEOUT: "⚠️ Invalid input. Your answer took too long to check, please simplify it.",
+    UNAVAILABLE: "⚠️ Your answer could not be checked right now. Please try again in a moment.",
+    ERROR: "⚠️ Something went wrong while checking your answer. Please try again.",
+}
+
+# Verdicts that say nothing about the answer itself, so they are never cached
+UNCACHED = (TIMEOUT, UNAVAILABLE, ERROR)
+LAST_QUESTION_FEEDBACK = "✅ ⭐ Gudjob! ⭐"
+
+# verdict: one of the verdicts above
+# expr: the parsed answer ('' if it could not be parsed)
+# latex: the parsed answer rendered for display ('' if it could not be parsed)
+# reason: guard reason code for rejected answers
+# fingerprint: hash of the answer's derivative at the sample points ('' if none);
+#     equivalent answers share a fingerprint
+# timings: seconds spent in each stage of the check ({stage: seconds}), or None
+Result = namedtuple("Result", "verdict expr latex reason fingerprint timings", defaults=('', guard.OK, '', None))
+
+# Verdicts per equivalence class, keyed on (integrand, fingerprint). Once one answer
+# of a class is graded, every equivalent answer reuses its verdict.
+class_verdicts = VerdictCache(maxsize=5000)
+
+
+# Function to render a parsed answer as LaTeX, with inverse trig as sin^{-1} and log as ln
+def render_latex(expr):
+    latex_output = sp.latex(expr)
+    latex_output = re.sub(r'(operatorname{a)(sin|cos|tan|csc|sec|cot)(h?)', r'\2\3^{-1', latex_output)
+    latex_output = re.sub(r'\\log', r'\\ln', latex_output)  # Replace log with ln
+    return latex_output
+
+
+# Function to get the feedback code of a result: the guard reason for rejected answers, else the verdict.
+# Sessions keep this short code instead of the message.
+def feedback_code(result):
+    return result.reason if result.verdict == REJECTED else result.verdict
+
+
+# Function to pick the feedback message for a feedback code
+def feedback_message(code, last_question=False):
+    if code in guard.MESSAGES:
+        return guard.MESSAGES[code]
+    if code == CORRECT and last_question:
+        return LAST_QUESTION_FEEDBACK
+    return FEEDBACK[code]
+
+
+# Function to pick the feedback message for a result
+def feedback(result, last_question=False):
+    return feedback_message(feedback_code(result), last_question)
+
+
+# Function to turn a failed pre-screen into a result
+def rejected(screen):
+    return Result(REJECTED, '', '', screen.reason)
+
+
+# Function to read an answer into a SymPy expression (the stopwatch laps "preprocess")
+def parse(answer, stopwatch):
+    # Preprocess the input to ensure multiplication is implied where needed
+    user_answer = preprocess_input(answer.replace(" ", ""))
+    stopwatch.lap("preprocess")
+
+    # Convert input string to sympy expression
+    return sp.sympify(user_answer)
+
+
+# Function to drop absolute values so the answer can be differentiated (ln|x| -> ln(x))
+def without_abs(user_expr):
+    return sp.sympify(re.sub(r'Abs', r'', str(user_expr)))
+
+
+# Function to grade an answer: the answer is correct if its derivative equals the integrand f_x
+# (for a Definite, if its value equals the value of the integral)
+def grade(answer, f_x):
+    stopwatch = metrics.Stopwatch()
+
+    # Reject pathological inputs before they reach sympify
+    screen = guard.screen(answer)
+    stopwatch.lap("screen")
+    if not screen.ok:
+        return rejected(screen)._replace(timings=stopwatch.timings)
+
+    user_expr = ''
+    try:
+        user_expr = parse(answer, stopwatch)
+        user_expr2 = without_abs(user_expr)
+        stopwatch.lap("sympify")
+
+        if isinstance(f_x, Definite):
+            # Definite integral: the answer is a number, compared with the precomputed value
+            equal, answer_class = checker.definite_check(f_x, user_expr)
+            verdict = CORRECT if equal else INCORRECT
+        else:
+            # Differentiate the student's answer (g x) to compare with the integrand
+            g_x = sp.diff(user_expr2, checker.x)
+            stopwatch.lap("diff")
+
+            # Rational functions on both sides (polynomials, partial fractions): decided exactly
+            exact = checker.exact_check(f_x, g_x)
+            if exact is not None:
+                equal, answer_class = exact
+                verdict = CORRECT if equal else INCORRECT
+            else:
+                # Evaluate g x once at the sample points; its fingerprint names the answer's equivalence class
+                user_vals = checker.sample(g_x)
+                answer_class = checker.fingerprint(user_vals) if user_vals is not None else ''
+                verdict = class_verdicts.get((f_x, answer_class)) if answer_class else None
+            if verdict is None:
+                reference = checker.reference(f_x)
+                if answer_class == reference.fingerprint and reference.valid >= checker.MIN_VALID_POINTS:
+                    # Same values as the integrand (precomputed fingerprint): correct without comparing point by point
+                    verdict = CORRECT
+                else:
+                    # Check if f x = g x at the sample points (points where either side is undefined are skipped)
+                    verdict = CORRECT if checker.is_equivalent(f_x, g_x, user_vals) else INCORRECT
+                if answer_class:
+                    class_verdicts.put((f_x, answer_class), verdict)
+        stopwatch.lap("evaluate")
+
+        latex = render_latex(user_expr)
+        stopwatch.lap("latex")
+        return Result(verdict, user_expr, latex, fingerprint=answer_class, timings=stopwatch.timings)
+
+    except Exception:
+        # Handle any errors (e.g., invalid user input)
+        try:
+            latex = render_latex(user_expr) if user_expr != '' else ''
+        except Exception:
+            # sympify gave something SymPy cannot print either (pi*ln! -> a function class): show the raw answer
+            user_expr, latex = '', answer
+        return Result(INVALID, user_expr, latex, timings=stopwatch.timings)
@@ -0,0 +1,203 @@
+import ast
+import math
+import threading
+from collections import Counter, namedtuple
+
+from lexer import LPAREN, NUMBER, OP, RPAREN, join_tokens, tokenize
+
+# Cheap pre-screen for submitted answers. It looks only at tokens and the
+# Python AST of the preprocessed string, so pathological inputs such as
+# 9**9**9**9, x**(10**8) or 1000000! are rejected in microseconds instead of
+# reaching sympify.
+
+# Bounds
+MAX_LENGTH = 400             # characters typed
+MAX_NODES = 300              # AST nodes after preprocessing
+MAX_DEPTH = 30               # nesting depth of parentheses and of function calls
+MAX_EXPONENT = 1000          # largest literal exponent, e.g. x^1000
+MAX_LITERAL_DIGITS = 1000    # largest constant sub-expression, in decimal digits
+MAX_TOWER = 2                # 2^(x^2) is fine, a^b^c^d is a power tower
+MAX_FACTORIAL = 100          # largest literal factorial, e.g. 100!
+
+# Reason codes
+OK = "ok"
+TOO_LONG = "too_long"
+TOO_MANY_NODES = "too_many_nodes"
+TOO_DEEP = "too_deep"
+EXPONENT_TOO_LARGE = "exponent_too_large"
+NUMBER_TOO_LARGE = "number_too_large"
+POWER_TOWER = "power_tower"
+FACTORIAL = "factorial"
+
+# Feedback shown to the student for each rejection
+MESSAGES = {
+    TOO_LONG: f"⚠️ Invalid input. Your answer is too long (at most {MAX_LENGTH} characters).",
+    TOO_MANY_NODES: "⚠️ Invalid input. Your answer has too many terms, please simplify it.",
+    TOO_DEEP: "⚠️ Invalid input. Your answer has too many nested parentheses.",
+    EXPONENT_TOO_LARGE: f"⚠️ Invalid input. Exponents larger than {MAX_EXPONENT} are not allowed.",
+    NUMBER_TOO_LARGE: "⚠️ Invalid input. Your answer contains a number that is too large.",
+    POWER_TOWER: "⚠️ Invalid input. Repeated powers like a^b^c^d are not allowed.",
+    FACTORIAL: f"⚠️ Invalid input. Factorials are limited to {MAX_FACTORIAL}!.",
+}
+
+Screen = namedtuple("Screen", "ok reason")
+PASSED = Screen(True, OK)
+
+# How many answers were rejected for each reason (in this process)
+rejections = Counter()
+_rejections_lock = threading.Lock()
+
+
+# Function to get a snapshot of the rejection counts ({reason: count})
+def rejection_counts():
+    with _rejections_lock:
+        return dict(rejections)
+
+
+# Function to count a rejection and return it
+def _reject(reason):
+    with _rejections_lock:
+        rejections[reason] += 1
+    return Screen(False, reason)
+
+
+class _Rejected(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+# Function to combine the magnitudes (log10 of the absolute value) of the two sides of an operator
+def _combine(op, left, right):
+    if isinstance(op, (ast.Add, ast.Sub)):
+        return max(left, right) + math.log10(2)
+    if isinstance(op, ast.Mult):
+        return left + right
+    if isinstance(op, ast.Div):
+        return left - right
+    if isinstance(op, ast.Pow):
+        # log10(a^b) = b * log10(a), with b itself only known by its magnitude
+        exponent = 10 ** min(right, 308)
+        return exponent * max(left, 0)
+    return None
+
+
+# Function to check a node and its children in one post-order pass. Returns an estimate
+# of log10 of the node's absolute value if it is a constant, otherwise None (it contains
+# x or a function call). calls is the number of function calls the node is nested in;
+# nodes is a one-item list counting the nodes seen so far.
+def _check(node, calls, nodes):
+    nodes[0] += 1
+    if nodes[0] > MAX_NODES:
+        raise _Rejected(TOO_MANY_NODES)
+    magnitude = None
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, (int, float)):
+            magnitude = math.log10(abs(node.value)) if node.value else -math.inf
+    elif isinstance(node, ast.UnaryOp):
+        magnitude = _check(node.operand, calls, nodes)
+    elif isinstance(node, ast.BinOp):
+        left = _check(node.left, calls, nodes)
+        right = _check(node.right, calls, nodes)
+        if isinstance(node.op, ast.Pow):
+            if _tower_height(node) > MAX_TOWER:
+                raise _Rejected(POWER_TOWER)
+            if right is not None and right > math.log10(MAX_EXPONENT):
+                raise _Rejected(EXPONENT_TOO_LARGE)
+        if left is not None and right is not None:
+            magnitude = _combine(node.op, left, right)
+    elif isinstance(node, ast.Call):
+        if calls + 1 > MAX_DEPTH:
+            raise _Rejected(TOO_DEEP)
+        if not isinstance(node.func, ast.Name):
+            _check(node.func, calls, nodes)
+        arguments = [_check(argument, calls + 1, nodes) for argument in node.args]
+        if getattr(node.func, "id", "") in ("factorial", "gamma") and arguments:
+            if arguments[0] is not None and arguments[0] > math.log10(MAX_FACTORIAL):
+                raise _Rejected(FACTORIAL)
+            if arguments[0] is not None:
+                # log10(n!) = lgamma(n + 1) / ln 10, so (10!)! is bounded like 3628800!
+                magnitude = math.lgamma(10 ** arguments[0] + 1) / math.log(10)
+    else:
+        for child in ast.iter_child_nodes(node):
+            _check(child, calls, nodes)
+
+    if magnitude is not None and magnitude > MAX_LITERAL_DIGITS:
+        raise _Rejected(NUMBER_TOO_LARGE)
+    return magnitude
+
+
+# Function to count how many powers are stacked in a power (a^b -> 1, a^b^c -> 2)
+def _tower_height(node):
+    height = 0
+    while isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        height += 1
+        node = node.right
+    return height
+
+
+# Function to rewrite postfix factorials as calls (5! -> factorial(5), (10**6)! -> factorial((10**6)),
+# sin(x)! -> factorial(sin(x)), 5!x -> factorial(5)*x), so the AST pass sees the magnitude of what is factorialized
+def _factorial_calls(source):
+    while "!" in source:
+        end = source.index("!")
+        start = end
+        if start and source[start - 1] == ")":
+            # Back to the matching parenthesis
+            depth = 0
+            while start:
+                start -= 1
+                if source[start] == ")":
+                    depth += 1
+                elif source[start] == "(":
+                    depth -= 1
+                    if depth == 0:
+                        break
+        # A number, a name, or the name of the function called with the group
+        while start and (source[start - 1].isalnum() or source[start - 1] in "._"):
+            start -= 1
+        rest = source[end + 1:]
+        if rest and (rest[0].isalnum() or rest[0] in "(._"):
+            rest = "*" + rest  # Implied multiplication: 5!x, (x+1)!(x-1)!
+        source = f"{source[:start]}factorial({source[start:end]}){rest}"
+    return source
+
+
+# Function to check an answer against the bounds; returns Screen(ok, reason)
+def screen(answer):
+    if len(answer) > MAX_LENGTH:
+        return _reject(TOO_LONG)
+    # Screen the text that gets parsed: grading drops spaces, so "1 0 0 0!" is 1000!
+    answer = answer.replace(" ", "")
+
+    # Token level: parenthesis nesting, factorials of large literals and stacked factorials (5!!)
+    tokens = list(tokenize(answer))
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.kind == LPAREN:
+            depth += 1
+            if depth > MAX_DEPTH:
+                return _reject(TOO_DEEP)
+        elif token.kind == RPAREN:
+            depth -= 1
+        elif token.kind == OP and token.text == "!":
+            before = tokens[i - 1] if i else None
+            after = tokens[i + 1] if i + 1 < len(tokens) else None
+            if after is not None and after.text == "!":
+                return _reject(FACTORIAL)
+            if before is not None and before.kind == NUMBER and float(before.text) > MAX_FACTORIAL:
+                return _reject(FACTORIAL)
+
+    # AST level: size, nested function calls, powers and large constants
+    source = _factorial_calls(join_tokens(tokens).replace("^", "**"))
+    try:
+        tree = ast.parse(source, mode="eval")
+    except (SyntaxError, ValueError):
+        # Not our job; sympify will report the invalid input
+        return PASSED
+
+    try:
+        _check(tree.body, 0, [0])
+    except _Rejected as rejection:
+        return _reject(rejection.reason)
+    return PASSED
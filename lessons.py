@@ -0,0 +1,386 @@
+import textwrap
+from functools import lru_cache
+
+import streamlit as st
+
+# Lesson notes for each quiz page, as data instead of hundreds of st.write /
+# st.latex calls. Each page has a title, an introduction and worked examples;
+# an example is a problem and the steps of its solution. A step is one of
+#   ("text", markdown)
+#   ("latex", formula)
+#   ("columns", spec, [[steps of column 1], [steps of column 2], ...])
+# The compiled form is built once per server process and shared by every session.
+
+LESSONS = {
+    "u_sub": {
+        "title": "U-Sub",
+        "intro": [
+            ("text", """
+                - Technique that can solve most of the complicated integral problems (in Math 21).
+                - Used when the integral does not have a direct formula and is already simplified.
+            """),
+            ("text", "U-sub is a powerful technique, but the challenge lies in figuring out which expression to substitute with $u$. We can never be certain that our choice of $u$ is correct, so here are the following tips."),
+            ("text", "**Good candidates for u-sub:**"),
+            ("text", """
+                1. Inside of a parenthesis (Grouped expressions, base of an exponent, etc.)
+                2. The denominator or the radicand if there is a radical.
+                3. Looking ahead that the resulting $du$ will simplify the integrand (best way and needs practice)
+                4. Practice.
+                5. The $u$ must be simple. Choose $u$ so that there is no need for the product rule or complicated chain rule when obtaining $du$.
+            """),
+            ("text", "**Note:** When performing u-sub, the resulting integral must have $u$ as the only variable. There should be no $x$ left. If it is not possible to express all terms of $x$ into $u$, then the choose of $u$ in u-sub is incorrect."),
+        ],
+        "examples": [
+            {
+                "title": "Example A:",
+                "problem": r"\int \sec^2 x(\sin x+\tan^2 x) \, dx",
+                "steps": [
+                    ("text", "Before performing u-sub, simplify the integrand first if applicable."),
+                    ("latex", r"= \int (\sec x \tan x + \sec^2 x \tan^2 x) \, dx"),
+                    ("text", "Next, we can see that the first term can be solved right away, while the second term doesn’t have a direct formula and can’t be simplified further. Thus, it will need u-sub to solve."),
+                    ("latex", r"= \sec x + \int \sec^2 x \tan^2 x \, dx"),
+                    ("text", r"For u-sub, notice that when $u = \tan x$, then $du = \sec² x dx$, which is present on the integral. Thus by look ahead, $u = \tan x$ is a good u-sub as it simplifies the integral further."),
+                    ("latex", r"u = \tan x, \quad \, du = \sec^2 x \, dx \, \ \rightarrow \, \ \frac{1}{\sec^2 x} \, du = dx"),
+                    ("text", "Hence,"),
+                    ("latex", r"= \sec x + \int \sec^2 x \, u^2 \frac{1}{\sec^2 x} \, du"),
+                    ("latex", r"= \sec x + \int u^2 \, du"),
+                    ("latex", r"= \sec x + \frac{1}{3} u^3 + C"),
+                    ("text", "Substitute $x$ back to $u$."),
+                    ("latex", r"= \boxed{\sec x + \frac{1}{3} \tan^3 x + C}"),
+                ],
+            },
+            {
+                "title": "Example B:",
+                "problem": r"\int (4x - 1)^2(2x - 1)^4 \, dx",
+                "steps": [
+                    ("text", "One way to solve the integral is to expand the whole expression first, but that approach is too difficult and time-consuming. Instead, we can use u-sub and we have the choice to let $u$ as $4x-1$ or $2x-1$. The better option in this case is $u = 2x - 1$ so that we can avoid expanding $(2x - 1)^4$, and squaring an expression is much simpler than raising it to the fourth power."),
+                    ("latex", r"u = 2x - 1, \quad \, du = 2 \, dx \ \, \rightarrow \, \ \frac{1}{2} du = dx"),
+                    ("text", "Thus, the integral becomes:"),
+                    ("latex", r"= \frac{1}{2} \int (4x - 1)^2 u^4 \, du"),
+                    ("text", "In the integral, we have the remaining $(4x - 1)^2$ to turn into u before proceeding. To achieve this, we must express $u = 2x - 1$ into $4x - 1$."),
+                    ("latex", "u = 2x - 1"),
+                    ("text", "We want the coefficient of $x$ to be $4$, so we multiply by 2:"),
+                    ("latex", "2u = 4x - 2"),
+                    ("text", "We want $4x - 1$, so next, we add both sides by 1:"),
+                    ("latex", "2u + 1 = 4x - 1"),
+                    ("text", "Thus, we have:"),
+                    ("latex", r"= \frac{1}{2} \int (2u + 1)^2 u^4 \, du"),
+                    ("text", "Now, this is much easier to simplify."),
+                    ("latex", r"= \frac{1}{2} \int (4u^2 + 4u + 1) u^4 \, du"),
+                    ("latex", r"= \frac{1}{2} \int (4u^6 + 4u^5 + u^4) \, du"),
+                    ("latex", r"= \frac{1}{2} \left( \frac{4}{7} u^7 + \frac{4}{6} u^6 + \frac{1}{5} u^5 \right) + C"),
+                    ("latex", r"= \boxed{\frac{2}{7} (2x - 1)^7 + \frac{1}{3} (2x - 1)^6 + \frac{1}{10} (2x - 1)^5 + C}"),
+                ],
+            },
+        ],
+    },
+    "ibp": {
+        "title": "IBP",
+        "intro": [
+            ("text", 'Integration by parts is the "Product Rule" version of integrals. It follows the rule:'),
+            ("latex", r"\int u \,dv = uv - \int v \,du"),
+            ("text", "And choosing the expression for $u$ follows the mnemonic **LIATE**."),
+            ("text", "Ayun lang."),
+        ],
+        "examples": [
+            {
+                "title": "Example A:",
+                "problem": r"\int x \csc^2 x \, dx",
+                "steps": [
+                    ("text", "If we try, for example, applying u-sub on the given problem, we will notice that it leads to nowhere. The given is a product of two expressions, and this is where IBP comes in."),
+                    ("text", r"The given consists of an **A**lgebraic expression $x$ and a **T**rig function $\csc^2 x$. According to LIATE, A (Algebraic) comes first, so that is our $u$, at bale $dv$ yung natira."),
+                    ("columns", 2, [
+                        [
+                            ("latex", "u=x"),
+                            ("latex", r"\,du=\,dx"),
+                        ],
+                        [
+                            ("latex", r"\,dv=\csc^2 x\,dx"),
+                            ("latex", r"v=-\cot x"),
+                        ],
+                    ]),
+                    ("text", "Thus,"),
+                    ("latex", r"=-x \cot x - \int -\cot x \, dx"),
+                    ("latex", r"=\boxed{-x \cot x+\ln{|\sin x}|+C}"),
+                ],
+            },
+            {
+                "title": "Example B:",
+                "problem": r"\int_1^e \ln^2 x \, dx",
+                "steps": [
+                    ("text", r"The given only has the **L**ogarithmic function $\ln^2 x$ and that can be our $u$. What remained is the $dx$ and that will be our $dv$."),
+                    ("columns", 2, [
+                        [
+                            ("latex", r"u=\ln^2 x"),
+                            ("latex", r"\,du=\frac{2\ln x}{x}\,dx"),
+                        ],
+                        [
+                            ("latex", r"\,dv=\,dx"),
+                            ("latex", "v=x"),
+                        ],
+                    ]),
+                    ("text", "Thus,"),
+                    ("latex", r"=x \ln^2 x\Big|_1^e - \int_1^e \left(\frac{2\ln x}{x}\right) x \, dx"),
+                    ("latex", r"=x \ln^2 x\Big|_1^e - 2\int_1^e \ln x \, dx"),
+                    ("text", r"For the integral of $\ln x$, it is still not solvable with u-sub. Hence, we again apply IBP."),
+                    ("columns", 2, [
+                        [
+                            ("latex", r"\bar{u}=\ln x"),
+                            ("latex", r"\,d \bar{u}=\frac{1}{x}\,dx"),
+                        ],
+                        [
+                            ("latex", r"\,d\bar{v}=\,dx"),
+                            ("latex", r"\bar{v}=x"),
+                        ],
+                    ]),
+                    ("text", "We have:"),
+                    ("latex", r"=x \ln^2 x\Big|_1^e - 2\left(x \ln x\Big|_1^e - \int_1^e \, dx\right)"),
+                    ("latex", r"=x \ln^2 x\Big|_1^e - 2\left(x \ln x\Big|_1^e - x\Big|_1^e \right)"),
+                    ("text", "Be very careful with the parentheses and signs."),
+                    ("latex", r"=\Big[x \ln^2 x- 2x \ln x + 2x \Big|_1^e"),
+                    ("latex", r"=\Big[e \ln^2(e)- 2e \ln(e) + 2e\Big]-\Big[ \ln^2(1)- 2 \ln(1) + 2\Big]"),
+                    ("latex", r"=\Big[e-2e+2e\Big]-\Big[0-0+2\Big]"),
+                    ("latex", r"=\boxed{e-2}"),
+                ],
+            },
+            {
+                "title": "Example C:",
+                "problem": r"\int e^{3x}\sin(9x) \, dx",
+                "steps": [
+                    ("text", "According to LIATE:"),
+                    ("columns", 2, [
+                        [
+                            ("latex", r"u=\sin(9x)"),
+                            ("latex", r"\,du=9\cos(9x)\,dx"),
+                        ],
+                        [
+                            ("latex", r"\,dv=e^{3x}\,dx"),
+                            ("latex", r"v=\frac{1}{3}e^{3x}"),
+                        ],
+                    ]),
+                    ("text", "Thus,"),
+                    ("latex", r"=\frac{1}{3}e^{3x}\sin(9x)-3\int e^{3x}\cos(9x) \,dx"),
+                    ("text", "Next, the new integral requires another IBP."),
+                    ("columns", 2, [
+                        [
+                            ("latex", r"\bar{u}=\cos(9x)"),
+                            ("latex", r"\,d\bar{u}=-9\sin(9x)\,dx"),
+                        ],
+                        [
+                            ("latex", r"\,d\bar{v}=e^{3x}\,dx"),
+                            ("latex", r"\bar{v}=\frac{1}{3}e^{3x}"),
+                        ],
+                    ]),
+                    ("text", "Now, we have:"),
+                    ("latex", r"=\frac{1}{3}e^{3x}\sin(9x)-3\left(\frac{1}{3}e^{3x}\cos(9x)+3\int e^{3x}\sin(9x) \,dx\right)"),
+                    ("text", "Simplifying a bit:"),
+                    ("latex", r"=\frac{1}{3}e^{3x}\sin(9x)-e^{3x}\cos(9x)-9\int e^{3x}\sin(9x) \,dx"),
+                    ("text", "Note that all of these is equal to the original problem."),
+                    ("latex", r"\int e^{3x}\sin(9x) \, dx=\frac{1}{3}e^{3x}\sin(9x)-e^{3x}\cos(9x)-9\int e^{3x}\sin(9x) \,dx"),
+                    ("text", "Algebra as follows:"),
+                    ("latex", r"10\int e^{3x}\sin(9x) \, dx=\frac{1}{3}e^{3x}\sin(9x)-e^{3x}\cos(9x)"),
+                    ("text", "Therefore,"),
+                    ("latex", r"\int e^{3x}\sin(9x) \, dx=\boxed{\frac{1}{30}e^{3x}\sin(9x)-\frac{1}{10}e^{3x}\cos(9x)+C}"),
+                ],
+            },
+            {
+                "title": "Example D: (Using the Tabular Method)",
+                "problem": r"\int x^3 e^{x} \, dx",
+                "steps": [
+                    ("text", "Tabular method is a shortcut for applying IBP multiple times. It works best when IBP needs to be performed repeatedly to solve the integral."),
+                    ("text", "The method follows the same rules for choosing $u$ and $dv$, but instead of applying IBP step by step, you repeatedly differentiate $u$ and integrate $dv$ as part of the shortcut. Assign alternating signs to each row, then multiply diagonally, similar to $uv$ in IBP, and combine them all. The last row is multiplied and forms the last integral."),
+                    ("columns", [5, 1, 5], [
+                        [
+                            ("latex", "+"),
+                            ("latex", "-"),
+                            ("latex", "+"),
+                            ("latex", "-"),
+                            ("latex", "+"),
+                        ],
+                        [
+                            ("latex", "u=x^3"),
+                            ("latex", "3x^2"),
+                            ("latex", "6x"),
+                            ("latex", "6"),
+                            ("latex", "0"),
+                        ],
+                        [
+                            ("latex", r"\,dv=e^x\,dx"),
+                            ("latex", "e^x"),
+                            ("latex", "e^x"),
+                            ("latex", "e^x"),
+                            ("latex", "e^x"),
+                        ],
+                    ]),
+                    ("text", "Now, multiplying diagonally and taking into account of the alternating signs:"),
+                    ("latex", r"=x^3e^x-3x^2e^x+6xe^x-6e^x+\int (0)(e^x)\,dx"),
+                    ("text", "We already have our final answer."),
+                    ("latex", r"=\boxed{x^3e^x-3x^2e^x+6xe^x-6e^x+C}"),
+                    ("text", "The tabular method can also be applied to the previous examples, and the row at which you stop differentiating/integrating depends on the integral. If the given does not require many IBPs, then this method is essentially the same as the standard $u$-$dv$ approach."),
+                    ("text", "If you are interested, check out this [1 min yt short by bprp](https://youtu.be/N1KLaLi_LjA?si=AF78SVhlNmoBGgbq) on how to utilize the tabular method more effectively."),
+                ],
+            },
+        ],
+    },
+    "trig": {
+        "title": "Trig Integ",
+        "intro": [
+            ("text", "Trigonometric integrals involve integrating trig functions and applying special techniques, depending on their exponents."),
+            ("text", "Recall the following trigonometric identities:"),
+            ("text", r"""
+                - $\sin^2x+\cos^2x=1$
+                - $\tan^2x+1=\sec^2x$
+                - $1+\cot^2x=\csc^2x$
+            """),
+            ("text", r"""
+                - $\sin^2x=\frac{{1}}{{2}}(1-\cos(2x))\quad$(NEW)
+                - $\cos^2x=\frac{{1}}{{2}}(1+\cos(2x))\quad$(NEW)
+            """),
+            ("text", "The module provides instructions on the procedures to follow depending the trig present and their exponents. However, it is not really required to memorize them to answer different cases of trig integ."),
+            ("text", "Trig integ is all about determining when to apply u-sub and when to use trigonometric identities. When performing u-sub, you can anticipate what $du$ will be and whether it will simplify the integral. Ofc, this requires practice if we are opting not to memorize anything. However, there are some special cases that we simply need to remember."),
+        ],
+        "examples": [
+            {
+                "title": "Example A:",
+                "problem": r"\int \sec^3x\tan^3x \, dx",
+                "steps": [
+                    ("text", r"Let's try u-sub, $u=\tan x$. Looking ahead, $du$ will be $\sec^2 x$, which means it will cancel two secants on the integrand, leaving one left, $\sec x$. All the $\tan x$ can be subsituted into $u$, but it is not possible to turn a single $\sec x$ in terms of $u$. Usually, when the other trig has an odd number of exponent left, the choice of u-sub is incorrect."),
+                    ("text", r"Next, let's try $u=\sec x$. Looking ahead, $du$ will be $\sec x\tan x$, which will cancel one each with the integrand, leaving two of each left, $\sec^2 x\tan^2 x$. All the $\sec x$ can be substituted into $u$, and the remaining $\tan^2 x$ can be turned into $\sec^2 x-1$ using trigonometric identity. Since the exponent of $\tan x$ is even, it became possible to express all expressions in terms of $u$."),
+                    ("text", "All of these is an example of a thought process when looking ahead."),
+                    ("latex", r"u = \sec x, \quad \, du = \sec x\tan x \, dx"),
+                    ("text", "Thus,"),
+                    ("latex", r"=\int \sec^2 x\tan^2 x \, du"),
+                    ("latex", r"=\int \sec^2 x(\sec^2 x-1)) \, du"),
+                    ("latex", r"=\int u^2(u^2-1)) \, du"),
+                    ("latex", r"=\int (u^4-u^2) \, du"),
+                    ("latex", r"=\frac{1}{5}u^5-\frac{1}{3}u^3+C"),
+                    ("text", "Substituting back:"),
+                    ("latex", r"=\boxed{\frac{1}{5}\sec^5 x-\frac{1}{3}\sec^3 x+C}"),
+                ],
+            },
+            {
+                "title": "Example B:",
+                "problem": r"\int \sin^4 x \, dx",
+                "steps": [
+                    ("text", r"If the exponents of $\sin x$ and $\cos x$ are both even, then we apply the (NEW) trigonometric identities we've learned. If for example that one of them has an odd exponent, then it's just u-sub."),
+                    ("text", r"Exponent of $\cos x$ in our given is 0 since it's not there, so technically even."),
+                    ("latex", r"= \int (\sin^2 x)^2 \, dx"),
+                    ("latex", r"= \int \left(\frac{1}{2}(1-\cos(2x))\right)^2 \, dx"),
+                    ("latex", r"= \frac{1}{4} \int (1-2\cos(2x)+\cos^2(2x)) \, dx"),
+                    ("text", "We can easily integrate the first two terms."),
+                    ("latex", r"= \frac{1}{4}(x-\sin(2x)) + \frac{1}{4} \int \cos^2(2x) \, dx"),
+                    ("text", r"Since the exponent of $\cos x$ is still even, we apply again the (NEW) trig identity."),
+                    ("latex", r"= \frac{1}{4}(x-\sin(2x)) + \frac{1}{4} \int \frac{1}{2}(1+\cos(4x)) \, dx"),
+                    ("latex", r"= \frac{1}{4}(x-\sin(2x)) + \frac{1}{8} \left(x+\frac{1}{4}\sin(4x)\right)+C"),
+                    ("text", "Simplifying a bit:"),
+                    ("latex", r"= \boxed{\frac{3}{8}x-\frac{1}{4}\sin(2x) + \frac{1}{32}\sin(4x)+C}"),
+                ],
+            },
+            {
+                "title": "Example C:",
+                "problem": r"\int \csc^3 x \, dx",
+                "steps": [
+                    ("text", r"If the exponent of $\sec x$ OR $\csc x$ is odd AND the exponent of $\tan x$ OR $\cot x$ is even, then the only way to solve the trig integ is thru IBP."),
+                    ("text", r"Otherwise, if the exponent of $\sec x$ OR $\csc x$ is even OR the exponent of $\tan x$ OR $\cot x$ is odd, then they are much simpler. Either by trigonometric identity or just u-sub. (More of these cases on the Exercise)"),
+                    ("text", "When performing IBP on a trig integ, put an expression on $dv$ that is easy to integrate."),
+                    ("columns", [3, 1, 8], [
+                        [
+                            ("latex", "+"),
+                            ("latex", "-"),
+                        ],
+                        [
+                            ("latex", r"u=\csc x"),
+                            ("latex", r"du=-\csc x\cot x"),
+                        ],
+                        [
+                            ("latex", r"dv=\csc^2 x \,dx"),
+                            ("latex", r"v=-\cot x"),
+                        ],
+                    ]),
+                    ("text", "Thus,"),
+                    ("latex", r"=-\csc x\cot x - \int \csc x\cot^2 x \, dx"),
+                    ("text", r"The exponent of $\csc x$ and $\cot x$ are odd and even, but we have already applied IBP. To proceed, we will apply trigonometric identity on the even exponent trig."),
+                    ("latex", r"=-\csc x\cot x - \int \csc x(\csc^2 x-1) \, dx"),
+                    ("latex", r"=-\csc x\cot x - \int (\csc^3 x-\csc x) \, dx"),
+                    ("latex", r"=-\csc x\cot x +\ln{|\csc x-\cot x|} - \int \csc^3 x \, dx"),
+                    ("text", "Note that all of these is equal to the original problem."),
+                    ("latex", r"\int \csc^3 x \, dx=-\csc x\cot x +\ln{|\csc x-\cot x|} - \int \csc^3 x \, dx"),
+                    ("text", "Performing algebra and simplifying:"),
+                    ("latex", r"2\int \csc^3 x \, dx=-\csc x\cot x +\ln{|\csc x-\cot x|}"),
+                    ("latex", r"\int \csc^3 x \, dx=\boxed{-\frac{1}{2}\csc x\cot x +\frac{1}{2}\ln{|\csc x-\cot x|}}"),
+                ],
+            },
+        ],
+    },
+}
+
+
+def _is_list(text):
+    return text.startswith(("- ", "1. "))
+
+
+# Function to merge consecutive steps so each one is a single element on the page:
+# runs of text become one markdown block, runs of formulas one centered LaTeX block
+def _compile(steps):
+    compiled = []
+    for step in steps:
+        kind = step[0]
+        if kind == "columns":
+            compiled.append(("columns", step[1], tuple(_compile(column) for column in step[2])))
+            continue
+        content = textwrap.dedent(step[1]).strip()
+        if compiled and compiled[-1][0] == kind:
+            previous = compiled[-1][1]
+            if kind == "latex":
+                compiled[-1] = ("latex", previous + [content])
+                continue
+            if not (_is_list(previous[-1]) and _is_list(content)):  # Keep separate lists separate
+                compiled[-1] = ("text", previous + [content])
+                continue
+        compiled.append((kind, [content]))
+
+    result = []
+    for step in compiled:
+        if step[0] == "text":
+            result.append(("text", "\n\n".join(step[1])))
+        elif step[0] == "latex":
+            lines = step[1]
+            formula = lines[0] if len(lines) == 1 else r"\begin{gathered}" + r" \\ ".join(lines) + r"\end{gathered}"
+            result.append(("latex", formula))
+        else:
+            result.append(step)
+    return tuple(result)
+
+
+# Function to get the compiled lesson of a page: (title, intro, ((title, problem, steps), ...))
+@lru_cache(maxsize=None)
+def lesson(page):
+    data = LESSONS[page]
+    examples = tuple((example["title"], example["problem"], _compile(example["steps"])) for example in data["examples"])
+    return data["title"], _compile(data["intro"]), examples
+
+
+def _render_steps(steps):
+    for step in steps:
+        if step[0] == "text":
+            st.markdown(step[1])
+        elif step[0] == "latex":
+            st.latex(step[1])
+        else:
+            for column, column_steps in zip(st.columns(step[1]), step[2]):
+                with column:
+                    _render_steps(column_steps)
+
+
+# Function to display the notes of a page; each solution is in a collapsed section
+def render(page):
+    if page not in LESSONS:
+        return
+    title, intro, examples = lesson(page)
+    st.subheader(title)
+    _render_steps(intro)
+    for example_title, problem, steps in examples:
+        st.subheader(example_title)
+        st.latex(problem)
+        with st.expander("Solution"):
+            _render_steps(steps)
@@ -0,0 +1,149 @@
+import re
+from collections import namedtuple
+
+# Single-pass lexer for student answers. It turns what students type
+# ("-1/2cos2x", "x^3/3lnx", "ln|cos x|") into a string SymPy can parse
+# ("-1/2*cos(2*x)", "x^3/3*ln(x)", "ln(abs(cos(x)))") in one left-to-right scan.
+
+# Token kinds
+NUMBER = "number"    # 2, 0.5, .5
+VAR = "var"          # the variable x
+NAME = "name"        # constants and other identifiers: pi, E, C, y ...
+FUNC = "func"        # sin, arctan, ln, sqrt ...
+LPAREN = "lparen"
+RPAREN = "rparen"
+BAR = "bar"          # | for absolute value
+OP = "op"            # + - * / ^ , and anything else
+
+Token = namedtuple("Token", "kind text pos")
+
+# Trig functions, their hyperbolic versions and inverses (asin or arcsin)
+TRIG = ("sin", "cos", "tan", "csc", "sec", "cot")
+FUNCTIONS = {"sqrt", "cbrt", "ln", "log", "exp", "abs", "Abs"}
+for _name in TRIG:
+    for _hyp in ("", "h"):
+        FUNCTIONS.update({_name + _hyp, "a" + _name + _hyp, "arc" + _name + _hyp})
+
+# Multi-letter names that must not be split into single letters
+CONSTANTS = {"pi", "E", "oo"}
+
+KNOWN_NAMES = FUNCTIONS | CONSTANTS
+
+# Names written the way students write them, and what SymPy calls them (e^x is Euler's number, not a symbol)
+ALIASES = {"e": "E"}
+
+# Tokens after which an operand ends, and tokens that start a new operand.
+# Implicit multiplication goes between the two (2x, x sin x, (x+1)(x-1), ...).
+OPERAND_END = {NUMBER, VAR, NAME, RPAREN}
+OPERAND_START = {NUMBER, VAR, NAME, FUNC, LPAREN}
+
+
+# One compiled pattern for all tokens, tried left to right at each position. Single
+# characters come first since they are the most common; known names are listed
+# longest first so "arcsinh" wins over "arcsin" and "asin".
+_NAMES = "|".join(sorted(KNOWN_NAMES, key=len, reverse=True))
+_TOKEN_RE = re.compile(rf"""
+    (?P<space>\s+)
+  | (?P<{NUMBER}>\d+\.?\d*|\.\d+)
+  | (?P<{LPAREN}>\()
+  | (?P<{RPAREN}>\))
+  | (?P<{BAR}>\|)
+  | (?P<{OP}>[^\w\s]|_)
+  | (?P<{VAR}>x)
+  | (?P<known>{_NAMES})
+  | (?P<{NAME}>(?:(?!x|{_NAMES})[^\W\d_])+)     # unknown identifier: letters up to the next x or known name
+""", re.VERBOSE)
+
+
+# Function to split an expression into tokens in one pass
+def tokenize(expression):
+    for match in _TOKEN_RE.finditer(expression):
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        text = match.group()
+        if kind == "known":
+            kind = FUNC if text in FUNCTIONS else NAME
+        yield Token(kind, text, match.start())
+
+
+# Function to read the short argument of a function written without parentheses:
+# sinx, sin2x, sin2, lnx, and nested ones like lncosx. Returns the argument and the next index.
+def _bare_argument(tokens, i):
+    n = len(tokens)
+    if i < n and tokens[i].kind == FUNC:
+        inner, j = _bare_argument(tokens, i + 1)
+        if inner is None:
+            return None, i
+        return "(" + _function_name(tokens[i].text) + inner + ")", j
+    args = []
+    if i < n and tokens[i].kind == NUMBER:
+        args.append(tokens[i].text)
+        i += 1
+    if i < n and tokens[i].kind in (VAR, NAME):
+        args.append(tokens[i].text)
+        i += 1
+    if not args:
+        return None, i
+    return "(" + "*".join(args) + ")", i
+
+
+# arcsin -> asin
+def _function_name(name):
+    return "a" + name[3:] if name.startswith("arc") else name
+
+
+# Function to preprocess user input by ensuring multiplication is implied (like "6x" becoming "6*x")
+def preprocess_input(expression):
+    return join_tokens(list(tokenize(expression)))
+
+
+# Function to write a list of tokens back as a SymPy-readable string, with implied multiplication made explicit
+def join_tokens(tokens):
+    output = []
+    n = len(tokens)
+    prev = None          # kind of the last operand-like token written
+    prev_text = ""
+    open_bars = 0        # number of | still waiting for their closing |
+    i = 0
+    while i < n:
+        token = tokens[i]
+        kind = token.kind
+
+        # A | closes an absolute value if it follows an operand and one is open, otherwise it opens one
+        if kind == BAR:
+            if prev in OPERAND_END and open_bars:
+                output.append("))")
+                open_bars -= 1
+                prev = RPAREN
+            else:
+                if prev in OPERAND_END:
+                    output.append("*")
+                output.append("(abs(")
+                open_bars += 1
+                prev = LPAREN
+            i += 1
+            continue
+
+        # Implicit multiplication, except for calls like f(x) or Abs(x)
+        call = prev == NAME and kind == LPAREN and prev_text not in CONSTANTS
+        if prev in OPERAND_END and kind in OPERAND_START and not call:
+            output.append("*")
+
+        if kind == FUNC:
+            output.append(_function_name(token.text))
+            argument, i = _bare_argument(tokens, i + 1)
+            if argument is not None:
+                output.append(argument)
+                prev = RPAREN
+            else:
+                prev = FUNC
+            continue
+
+        text = ALIASES.get(token.text, token.text) if kind == NAME else token.text
+        output.append(text)
+        prev = kind if kind != OP else None
+        prev_text = text
+        i += 1
+
+    return "".join(output)
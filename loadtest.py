@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+import bank
+from benchmark import CORPUS_PATH, ROOT, _meta, summarize
+
+# Load test for the app. Starts `streamlit run test.py` headless on localhost and
+# drives concurrent sessions over Streamlit's websocket protocol, like browsers
+# do: each session opens the menu and works through the questions of every
+# topic on it (starting at a different topic per session), submitting incorrect, invalid and correct answers from
+# bench_corpus.json. Widgets inside the quiz fragment rerun only that fragment,
+# as they do in a browser. Reports latency percentiles per interaction, the
+# server's memory (with its worker processes) and a capacity curve over session
+# counts.
+#
+#   python loadtest.py -o results.json              # sessions 1, 2, 4, 8, 16
+#   python loadtest.py -n 8 32 64
+#   python loadtest.py --compare baseline.json      # exit code 1 on regressions
+#   python loadtest.py --min-capacity 16            # exit code 1 below 16 sessions within the SLO
+
+DEFAULT_LEVELS = (1, 2, 4, 8, 16)
+DEFAULT_ATTEMPTS = 2        # wrong answers submitted before the correct one, per question
+DEFAULT_SLO = 500.0         # p99 "Check Answer" latency (ms) a session count must stay within
+DEFAULT_THRESHOLD = 0.25    # 25% slower than the baseline counts as a regression
+DEFAULT_PORT = 8599
+RSS_INTERVAL = 0.1          # seconds between memory samples
+TIMEOUT = 60.0              # seconds to wait for the server or for a script run
+
+# Menu button of each topic
+TOPIC_BUTTONS = {
+    "u_sub": "U-Substitution (Math 21)",
+    "ibp": "Integration by Parts",
+    "trig": "Trigonometric Integrals",
+    "trig_sub": "Trigonometric Substitution",
+    "partial_fractions": "Partial Fractions",
+}
+
+# Interactions timed by the load test
+INTERACTIONS = ("menu", "open", "type", "check", "next", "back")
+
+
+class Server:
+    # Headless `streamlit run test.py` on localhost: with Server(port) as server: ...
+    def __init__(self, port=DEFAULT_PORT):
+        self.port = port
+        self.process = None
+
+    def __enter__(self):
+        command = [
+            sys.executable, "-m", "streamlit", "run", "test.py",
+            "--server.headless", "true",
+            "--server.address", "127.0.0.1",
+            "--server.port", str(self.port),
+            "--browser.gatherUsageStats", "false",
+        ]
+        self.process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return self
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.__exit__()
+                    raise RuntimeError(f"streamlit did not start on port {self.port}")
+                time.sleep(0.2)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        return False
+
+    # Function to get the resident memory of the server and all its worker processes, in bytes
+    def rss(self):
+        return sum(_rss(pid) for pid in _process_tree(self.process.pid))
+
+
+def _process_tree(pid):
+    pids = [pid]
+    for parent in pids:
+        try:
+            for task in os.listdir(f"/proc/{parent}/task"):
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def _rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class Session:
+    # One browser session: sends reruns with the current widget values, like the frontend.
+    # with Session(port) as session: ...
+    def __init__(self, port):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.websocket = None
+        self.widgets = {}      # label -> widget id, from the last script run
+        self.fragments = {}    # label -> id of the fragment the widget is in ('' if none)
+        self.text = {}         # widget id -> text typed in it
+        self.markdown = []     # markdown shown by the last script run
+        self.errors = 0        # exceptions shown by the app
+
+    def __enter__(self):
+        self.websocket = connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=TIMEOUT).__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.websocket.__exit__(*exc)
+
+    # Function to rerun the script, or only the fragment with fragment_id (and any reruns it asks
+    # for); returns the seconds until it finished
+    def rerun(self, trigger=None, fragment_id=""):
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.fragment_id = fragment_id
+        for widget_id, text in self.text.items():
+            message.rerun_script.widget_states.widgets.append(WidgetState(id=widget_id, string_value=text))
+        if trigger is not None:
+            message.rerun_script.widget_states.widgets.append(WidgetState(id=trigger, trigger_value=True))
+
+        start = time.perf_counter()
+        self.websocket.send(message.SerializeToString())
+        widgets, fragments, markdown = {}, {}, []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.websocket.recv(timeout=TIMEOUT))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_kind = element.WhichOneof("type")
+                if element_kind in ("button", "text_input"):
+                    label = getattr(element, element_kind).label
+                    widgets[label] = getattr(element, element_kind).id
+                    fragments[label] = forward.delta.fragment_id
+                elif element_kind == "markdown":
+                    markdown.append(element.markdown.body)
+                elif element_kind == "exception":
+                    self.errors += 1
+            elif kind == "script_finished":
+                status = forward.script_finished
+                if status != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    break
+                widgets, fragments, markdown = {}, {}, []  # The app asked for a rerun: wait for that one
+        seconds = time.perf_counter() - start
+        if status == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+            # Only the fragment was redrawn: the widgets outside it are still there
+            rerun_fragments = {fragment_id, *fragments.values()}
+            kept = {label for label, fragment in self.fragments.items() if fragment not in rerun_fragments}
+            widgets = {**{label: self.widgets[label] for label in kept}, **widgets}
+            fragments = {**{label: self.fragments[label] for label in kept}, **fragments}
+        self.widgets, self.fragments, self.markdown = widgets, fragments, markdown
+        return seconds
+
+    def has(self, label):
+        return label in self.widgets
+
+    def click(self, label):
+        return self.rerun(self.widgets[label], self.fragments[label])
+
+    # Function to type into the answer box (the frontend reruns the script when the text is committed)
+    def type(self, text):
+        [label] = [label for label in self.widgets if label.startswith("Enter your answer")]
+        self.text = {self.widgets[label]: text}
+        return self.rerun(fragment_id=self.fragments[label])
+
+
+# Function to walk one session through topics in order, going back to the menu after each;
+# returns [(interaction, seconds)] and the errors shown
+def walk(port, topics, corpus, rng, attempts=DEFAULT_ATTEMPTS):
+    timings = []
+    with Session(port) as session:
+        timings.append(("menu", session.rerun()))
+        for topic in topics:
+            timings.append(("open", session.click(TOPIC_BUTTONS[topic])))
+            for index in range(len(bank.QUIZ_DATA[topic])):
+                answers = corpus.get(bank.question_id(topic, index), {})
+                wrong = answers.get("incorrect", []) + answers.get("adversarial", [])
+                submissions = rng.sample(wrong, min(attempts, len(wrong))) + rng.sample(answers.get("correct", []), 1)
+                for answer in submissions:
+                    timings.append(("type", session.type(answer)))
+                    timings.append(("check", session.click("Check Answer")))
+                if not session.has("Next Item"):
+                    break
+                timings.append(("next", session.click("Next Item")))
+            timings.append(("back", session.click("Back")))
+    return timings, session.errors
+
+
+# Function to run sessions concurrently against the server; returns the summary for this level
+def run_level(server, sessions, corpus, seed=0, attempts=DEFAULT_ATTEMPTS):
+    peak_rss = [server.rss()]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.wait(RSS_INTERVAL):
+            peak_rss.append(server.rss())
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    topics = sorted(TOPIC_BUTTONS)
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [
+            pool.submit(walk, server.port, topics[i % len(topics):] + topics[:i % len(topics)], corpus,
+                        random.Random(seed * 100003 + i), attempts)
+            for i in range(sessions)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    samples = {interaction: [] for interaction in INTERACTIONS}
+    for timings, _ in results:
+        for interaction, seconds in timings:
+            samples[interaction].append(seconds)
+    return {
+        "sessions": sessions,
+        "interactions": {interaction: summarize(s) for interaction, s in samples.items()},
+        "checks_per_second": round(len(samples["check"]) / elapsed, 2),
+        "errors": sum(errors for _, errors in results),
+        "rss_mb": round(max(peak_rss) / 2**20, 1),
+    }
+
+
+# Function to find the most sessions whose p99 "Check Answer" latency stays within the SLO (ms)
+def capacity(levels, slo=DEFAULT_SLO):
+    within = [level["sessions"] for level in levels
+              if level["interactions"]["check"].get("p99", float("inf")) <= slo * 1000 and not level["errors"]]
+    return max(within, default=0)
+
+
+def run(levels=DEFAULT_LEVELS, port=DEFAULT_PORT, corpus_path=CORPUS_PATH, attempts=DEFAULT_ATTEMPTS, slo=DEFAULT_SLO, seed=0):
+    with open(corpus_path) as f:
+        corpus = json.load(f)
+    with Server(port) as server:
+        idle_rss = server.rss()
+        walk(port, sorted(TOPIC_BUTTONS), corpus, random.Random(seed), attempts)  # Warm up: load SymPy and the workers
+        results = []
+        for sessions in levels:
+            level = run_level(server, sessions, corpus, seed, attempts)
+            check = level["interactions"]["check"]
+            print(f"{sessions:4d} sessions: check p50 {check.get('p50', 0) / 1000:8.1f}ms  p99 {check.get('p99', 0) / 1000:8.1f}ms  "
+                  f"{level['checks_per_second']:7.2f} checks/s  {level['rss_mb']:7.1f} MB  {level['errors']} errors", file=sys.stderr)
+            results.append(level)
+    return {
+        "meta": _meta(attempts=attempts, slo_ms=slo, cpus=os.cpu_count()),
+        "idle_rss_mb": round(idle_rss / 2**20, 1),
+        "levels": results,
+        "capacity": capacity(results, slo),
+    }
+
+
+# Function to list "Check Answer" percentiles that got slower than the baseline, per session count
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    old_levels = {level["sessions"]: level for level in baseline.get("levels", [])}
+    for level in results["levels"]:
+        old = old_levels.get(level["sessions"])
+        if old is None:
+            continue
+        new_check, old_check = level["interactions"]["check"], old["interactions"]["check"]
+        for key in ("p50", "p99"):
+            if key in new_check and old_check.get(key):
+                change = new_check[key] / old_check[key] - 1
+                if change > threshold:
+                    regressions.append((level["sessions"], key, old_check[key], new_check[key], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with concurrent sessions on localhost.")
+    parser.add_argument("-n", "--sessions", type=int, nargs="+", default=list(DEFAULT_LEVELS), help="concurrent session counts to run")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file (default: stdout)")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="answers to submit, per question id")
+    parser.add_argument("--attempts", type=int, default=DEFAULT_ATTEMPTS, help="wrong answers per question before the correct one")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port for the app server")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the answers each session picks")
+    parser.add_argument("--slo", type=float, default=DEFAULT_SLO, help="p99 Check Answer latency (ms) that defines capacity")
+    parser.add_argument("--min-capacity", type=int, help="exit with code 1 if fewer sessions stay within the SLO")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.sessions, args.port, args.corpus, args.attempts, args.slo, args.seed)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+
+    failed = False
+    if args.min_capacity is not None and results["capacity"] < args.min_capacity:
+        print(f"CAPACITY {results['capacity']} sessions within {args.slo:.0f}ms p99, expected at least {args.min_capacity}")
+        failed = True
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for sessions, key, old, new, change in regressions:
+            print(f"REGRESSION {sessions} sessions check {key}: {old / 1000:.1f}ms -> {new / 1000:.1f}ms (+{change:.0%})")
+        failed = failed or bool(regressions)
+        if not regressions:
+            print("No regressions.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import bisect
+import os
+import threading
+import time
+
+# Per-stage timing histograms for answer checks, per question. Disabled unless
+# MATH22_METRICS=1; when disabled record() returns immediately and nothing is
+# stored. Export as Prometheus text with render_prometheus(), or set
+# MATH22_METRICS_FILE to have the app keep a textfile-collector file up to date.
+
+ENABLED = os.environ.get("MATH22_METRICS", "").lower() in ("1", "true", "yes")
+METRICS_FILE = os.environ.get("MATH22_METRICS_FILE")
+WRITE_INTERVAL = 1.0  # seconds between metrics file writes
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Stages of a check, in pipeline order
+STAGES = ("cache", "screen", "preprocess", "sympify", "diff", "evaluate", "latex", "total")
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    # Function to estimate a quantile from the buckets (upper bound of the bucket it falls in)
+    def quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return float("nan")
+
+
+_histograms = {}  # (question, stage) -> Histogram
+_lock = threading.Lock()
+_last_write = 0.0
+
+
+# Function to record how long a stage took for a question
+def record(question, stage, seconds):
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get((question, stage))
+        if histogram is None:
+            histogram = _histograms[(question, stage)] = Histogram()
+        histogram.observe(seconds)
+    if METRICS_FILE:
+        _maybe_write()
+
+
+# Function to record every stage timing returned with a grading result
+def record_all(question, timings):
+    if not ENABLED or not timings:
+        return
+    for stage, seconds in timings.items():
+        record(question, stage, seconds)
+
+
+class Stopwatch:
+    # Collects consecutive stage timings: call lap(stage) at the end of each stage
+    __slots__ = ("timings", "last")
+
+    def __init__(self):
+        self.timings = {}
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = now - self.last
+        self.last = now
+
+
+class timer:
+    # Context manager timing a block: with metrics.timer("u_sub:1", "total"): ...
+    __slots__ = ("question", "stage", "start")
+
+    def __init__(self, question, stage):
+        self.question = question
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter() if ENABLED else 0.0
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            record(self.question, self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def _sorted_items():
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    with _lock:
+        items = [(key, h.counts[:], h.sum, h.count) for key, h in _histograms.items()]
+    return sorted(items, key=lambda item: (item[0][0], order.get(item[0][1], len(order)), item[0][1]))
+
+
+# Function to summarize the histograms: one row per (question, stage), times in milliseconds
+def summary():
+    rows = []
+    for (question, stage), counts, total, count in _sorted_items():
+        histogram = Histogram()
+        histogram.counts, histogram.sum, histogram.count = counts, total, count
+        rows.append({
+            "question": question,
+            "stage": stage,
+            "count": count,
+            "mean_ms": round(total / count * 1000, 3),
+            "p50_ms": histogram.quantile(0.5) * 1000,
+            "p99_ms": histogram.quantile(0.99) * 1000,
+        })
+    return rows
+
+
+# Function to escape a label value for the Prometheus text format
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Function to render the histograms in the Prometheus text exposition format
+def render_prometheus():
+    lines = [
+        "# HELP math22_check_stage_seconds Time spent in each stage of an answer check.",
+        "# TYPE math22_check_stage_seconds histogram",
+    ]
+    for (question, stage), counts, total, count in _sorted_items():
+        labels = f'question="{_label(question)}",stage="{_label(stage)}"'
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, counts):
+            cumulative += bucket
+            lines.append(f'math22_check_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'math22_check_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"math22_check_stage_seconds_sum{{{labels}}} {total:.9f}")
+        lines.append(f"math22_check_stage_seconds_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# Function to write the Prometheus text to a file atomically (for node_exporter's textfile collector)
+def write_prometheus(path):
+    with open(path + ".tmp", "w") as f:
+        f.write(render_prometheus())
+    os.replace(path + ".tmp", path)
+
+
+def _maybe_write():
+    global _last_write
+    now = time.monotonic()
+    if now - _last_write < WRITE_INTERVAL:
+        return
+    _last_write = now
+    try:
+        write_prometheus(METRICS_FILE)
+    except OSError:
+        pass
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
@@ -0,0 +1,187 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import grading
+import guard
+from cache import VerdictCache
+from executor import DONE, FAILED, TIMED_OUT, GradingExecutor
+from lexer import BAR, FUNC, KNOWN_NAMES, LPAREN, OP, RPAREN, join_tokens, tokenize
+from symbolic import sp
+
+# Live preview of an answer before it is checked: the parsed answer as LaTeX
+# (rendered exactly like "Your input"), or what is wrong with it and where.
+# Requests are handled on a small thread pool, not on the script thread. The
+# cheap checks (pre-screen, tokens) run there; sympify runs in worker processes
+# like grading does, with a memory ceiling and a short timeout, so an answer
+# that pins SymPy is killed instead of holding a thread of the app. Results are
+# cached by text, and when the new text extends the previous one (typing at the
+# end) the tokens of the unchanged prefix are reused.
+#
+# Streamlit sends the text when the student presses Enter or leaves the box, so
+# the debouncing here is latest-wins: a parse that has not started yet is
+# cancelled when a newer text arrives for the same session.
+
+DEFAULT_WORKERS = 2             # threads handling requests
+DEFAULT_PROCESSES = 1           # worker processes that run sympify (about a millisecond per answer)
+DEFAULT_TIMEOUT = 1.0           # seconds a worker may take to read an answer
+DEFAULT_WAIT = 0.3              # seconds the script waits for a preview before showing a placeholder
+CACHE_SIZE = 5000
+MAX_SESSIONS = 1000             # sessions whose last tokens are kept for prefix reuse
+
+# A name token can only change when the text after it changes within this many characters
+LOOKAHEAD = max(len(name) for name in KNOWN_NAMES)
+
+# ok: whether the answer can be read (it may still be wrong)
+# latex: the parsed answer ('' if not ok)
+# message: what is wrong ('' if ok)
+# position: index in the typed text of the problem, or None
+# reason: guard reason code if the pre-screen stopped it, TIMED_OUT if reading it took too long,
+#     FAILED if sympify could not read it (or the worker died)
+Preview = namedtuple("Preview", "ok latex message position reason", defaults=(guard.OK,))
+
+ALLOWED_OPERATORS = set("+-*/^,.!")
+
+_previews = VerdictCache(maxsize=CACHE_SIZE)
+
+
+# Function to tokenize text, reusing the tokens of previous_text if text extends it
+def tokenize_from(text, previous_text=None, previous_tokens=None):
+    if previous_tokens is None or not text.startswith(previous_text):
+        return list(tokenize(text))
+    safe_end = len(previous_text) - LOOKAHEAD
+    reused = []
+    for token in previous_tokens:
+        if token.pos + len(token.text) > safe_end:
+            break
+        reused.append(token)
+    start = reused[-1].pos + len(reused[-1].text) if reused else 0
+    return reused + [token._replace(pos=token.pos + start) for token in tokenize(text[start:])]
+
+
+# Function to find the first thing that makes the tokens unreadable; returns (message, token) or None
+def locate_error(tokens):
+    open_parens = []
+    bars = []
+    previous = None
+    for token in tokens:
+        kind, text = token.kind, token.text
+        if kind == OP and text not in ALLOWED_OPERATORS:
+            return f"Unexpected character {text!r}.", token
+        if kind == OP and text in "*/^" and (previous is None or previous.kind in (LPAREN, FUNC) or (
+                previous.kind == OP and not (previous.text == "*" and text == "*"))):
+            return "Missing a term before this operator.", token
+        if kind == RPAREN:
+            if previous is not None and previous.kind == LPAREN:
+                return "Empty parentheses.", token
+            if previous is not None and previous.kind == OP:
+                return "Missing a term before this parenthesis.", token
+            if not open_parens:
+                return "This parenthesis was never opened.", token
+            open_parens.pop()
+        elif kind == LPAREN:
+            open_parens.append(token)
+        elif kind == BAR:
+            bars.append(token)
+        previous = token
+
+    if open_parens:
+        return "This parenthesis is never closed.", open_parens[-1]
+    if len(bars) % 2:
+        return "This absolute value bar is never closed.", bars[-1]
+    if previous is not None and previous.kind == OP and previous.text != "!":
+        return "The answer ends with an operator.", previous
+    if previous is not None and previous.kind == FUNC:
+        return f"{previous.text} is missing its argument.", previous
+    return None
+
+
+# Function to read a preprocessed answer and render it like "Your input" (run in a worker process)
+def read_latex(source):
+    return grading.render_latex(sp.sympify(source))
+
+
+# Function to parse an answer the way grading does (spaces dropped, same lexer, sympify in
+# one of executor's workers); previous is an earlier (text, tokens) to reuse
+def parse(answer, executor, previous=None):
+    screen = guard.screen(answer)
+    if not screen.ok:
+        return Preview(False, "", guard.MESSAGES[screen.reason], None, screen.reason), None
+
+    # Positions in the answer of every non-space character, to report errors in the typed text
+    positions = [i for i, char in enumerate(answer) if char != " "]
+    text = answer.replace(" ", "")
+    tokens = tokenize_from(text, *(previous or (None, None)))
+    error = locate_error(tokens)
+    if error is not None:
+        message, token = error
+        return Preview(False, "", message, positions[token.pos]), tokens
+
+    status, latex = executor.run(join_tokens(tokens))
+    if status == DONE:
+        return Preview(True, latex, "", None), tokens
+    if status == TIMED_OUT:
+        return Preview(False, "", "This answer takes too long to read.", None, TIMED_OUT), tokens
+    return Preview(False, "", "This answer could not be read.", None, FAILED), tokens
+
+
+# Function to turn a preview of an unreadable answer into the grading result it would get;
+# None if only grading can tell (it was read, or reading it timed out or failed in the worker)
+def to_result(preview):
+    if preview.ok or preview.reason in (TIMED_OUT, FAILED):
+        return None
+    if preview.reason != guard.OK:
+        return grading.rejected(guard.Screen(False, preview.reason))
+    return grading.Result(grading.INVALID, '')
+
+
+# Function to get the cached preview of an answer (None if it was never parsed)
+def cached(answer):
+    return _previews.get(answer)
+
+
+class Previewer:
+    # Thread pool handling preview requests, with one pending request per session; sympify
+    # runs in a pool of worker processes
+    def __init__(self, workers=DEFAULT_WORKERS, processes=DEFAULT_PROCESSES, timeout=DEFAULT_TIMEOUT):
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self._executor = GradingExecutor(processes, timeout, task=read_latex)
+        self._lock = threading.Lock()
+        self._requests = {}     # session -> (answer, future), while the parse is pending
+        # session -> (text, tokens) of its last parse, for prefix reuse (least recently used dropped)
+        self._tokens = VerdictCache(maxsize=MAX_SESSIONS)
+
+    def _parse(self, session, answer):
+        preview, tokens = parse(answer, self._executor, self._tokens.get(session))
+        if tokens is not None:
+            self._tokens.put(session, (answer.replace(" ", ""), tokens))
+        _previews.put(answer, preview)
+        # Cached now, so the session's request is no longer needed (unless a newer one replaced it)
+        with self._lock:
+            pending = self._requests.get(session)
+            if pending is not None and pending[0] == answer:
+                del self._requests[session]
+        return preview
+
+    # Function to start parsing an answer for a session; returns a future of the Preview
+    def request(self, session, answer):
+        with self._lock:
+            pending = self._requests.get(session)
+            if pending is not None:
+                if pending[0] == answer:
+                    return pending[1]
+                pending[1].cancel()  # Superseded before it started
+            future = self._threads.submit(self._parse, session, answer)
+            self._requests[session] = (answer, future)
+            return future
+
+    # Function to get the preview of an answer, waiting at most wait seconds; None if not ready yet
+    def preview(self, session, answer, wait=DEFAULT_WAIT):
+        preview = cached(answer)
+        if preview is not None:
+            return preview
+        try:
+            return self.request(session, answer).result(wait)
+        except (FutureTimeout, CancelledError):
+            return None
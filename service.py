@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import artifacts
+import bank
+import cache
+import grading
+import guard
+import metrics
+from executor import DEFAULT_TIMEOUT, DEFAULT_WORKERS, GradingExecutor
+
+# Headless grading service. A small asyncio HTTP/JSON server in front of the
+# grading workers, so grading capacity does not depend on Streamlit reruns and
+# can run on other machines.
+#
+#   python service.py --port 8765
+#
+#   POST /check    {"question": "u_sub:1", "answer": "-1/2cos2x"}
+#                  (generated exercises add "integrand": "x*cos(3*x**2)")
+#                  -> {"verdict": "correct", "feedback": "...", "latex": "...", ...}
+#   GET  /health   -> {"status": "ok"}
+#   GET  /metrics  -> request, coalescing, overload and cache counters
+#   GET  /metrics/prometheus -> per-stage check timings (with MATH22_METRICS=1)
+#
+# Identical submissions that are already being graded share one grading job,
+# and when too many jobs are pending new ones get 503 instead of queueing.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_PENDING = 64         # grading jobs in flight before answering 503
+MAX_BODY = 64 * 1024             # bytes
+MAX_HEADER_LINES = 100
+
+# Metrics label of checks that send their own integrand (any question id could be sent with them)
+GENERATED_LABEL = "generated"
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+        self.message = message or status.phrase
+
+
+class GradingService:
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT, max_pending=DEFAULT_MAX_PENDING):
+        self.executor = GradingExecutor(workers=workers, timeout=timeout)
+        # Threads that block on the worker processes, one per worker
+        self.threads = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending
+        self.verdicts = cache.verdicts
+        self.verdicts.watch(bank.version())
+        self._in_flight = {}
+        self.started = time.time()
+        self.counters = {"requests": 0, "checks": 0, "coalesced": 0, "overloaded": 0, "errors": 0}
+
+    # Function to grade one submission, sharing the job with identical in-flight submissions.
+    # Generated exercises are not in the bank, so they send their integrand along.
+    async def check(self, qid, answer, integrand=None):
+        # Timings are labelled with the question id only once it is known to be in the bank,
+        # so clients cannot create new metrics
+        if integrand is None:
+            try:
+                page, index = bank.parse_question_id(qid)
+            except KeyError:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"unknown question {qid!r}")
+            f_x = bank.get_question(page, index)[1]
+            label = qid
+        else:
+            # The integrand gets the same pre-screen as answers
+            if not guard.screen(integrand).ok:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "integrand rejected")
+            page, index, f_x = qid, integrand, integrand
+            label = GENERATED_LABEL
+        self.counters["checks"] += 1
+        with metrics.timer(label, "total"):
+            return await self._grade(label, page, index, answer, f_x, integrand is None)
+
+    async def _grade(self, label, page, index, answer, f_x, bank_question):
+        key = cache.make_key(page, index, answer)
+        with metrics.timer(label, "cache"):
+            result = self.verdicts.get(key)
+        if result is not None:
+            return result
+
+        job = self._in_flight.get(key)
+        if job is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(job)
+
+        if len(self._in_flight) >= self.max_pending:
+            self.counters["overloaded"] += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "too many pending checks, retry later")
+
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(self.threads, self.executor.grade, answer, f_x)
+        self._in_flight[key] = job
+        try:
+            result = await asyncio.shield(job)
+        finally:
+            self._in_flight.pop(key, None)
+        metrics.record_all(label, result.timings)
+        if result.verdict not in grading.UNCACHED:
+            self.verdicts.put(key, result)
+        if bank_question:
+            cache.answer_classes.record(page, index, result.fingerprint)
+        return result
+
+    def metrics(self):
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "pending": len(self._in_flight),
+            "max_pending": self.max_pending,
+            "worker_restarts": self.executor.restarts,
+            "cache": self.verdicts.stats(),
+            "answer_classes": {bank.question_id(page, index): count
+                               for (page, index), count in sorted(cache.answer_classes.counts().items())},
+            "rejections": guard.rejection_counts(),
+            **self.counters,
+        }
+
+    # Function to route one request; returns (status, JSON body or text)
+    async def dispatch(self, method, path, body):
+        if path == "/check":
+            if method != "POST":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            try:
+                request = json.loads(body or b"{}")
+                qid, answer = request["question"], request["answer"]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'expected {"question": ..., "answer": ...}')
+            integrand = request.get("integrand")
+            if not isinstance(answer, str) or not isinstance(integrand, (str, type(None))):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "answer and integrand must be strings")
+            result = await self.check(qid, answer, integrand)
+            last_question = False
+            if integrand is None:
+                page, index = bank.parse_question_id(qid)
+                last_question = index == len(bank.QUIZ_DATA[page]) - 1
+            return HTTPStatus.OK, result_to_json(result, grading.feedback(result, last_question))
+        if path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if path == "/metrics":
+            return HTTPStatus.OK, self.metrics()
+        if path == "/metrics/prometheus":
+            return HTTPStatus.OK, metrics.render_prometheus()
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    # Function to serve one connection (HTTP/1.1 with keep-alive)
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = True
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                    headers = {}
+                    for _ in range(MAX_HEADER_LINES):
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    else:
+                        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+                    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                    body = await reader.readexactly(length) if length else b""
+                    self.counters["requests"] += 1
+                    status, payload = await self.dispatch(method, path.split("?")[0], body)
+                except HTTPError as error:
+                    status, payload = error.status, {"error": error.message}
+                except ValueError:
+                    status, payload, keep_alive = HTTPStatus.BAD_REQUEST, {"error": "malformed request"}, False
+                except Exception as error:
+                    self.counters["errors"] += 1
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        # Text payloads (Prometheus metrics) are sent as is, everything else as JSON
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    def close(self):
+        self.threads.shutdown(wait=False)
+        self.executor.shutdown()
+
+
+# Function to turn a grading Result into the JSON returned by /check
+def result_to_json(result, feedback):
+    return {
+        "verdict": result.verdict,
+        "feedback": feedback,
+        "latex": result.latex,
+        "reason": result.reason,
+        "fingerprint": result.fingerprint,
+    }
+
+
+class GradingClient:
+    # Client for the grading service, used by the app when GRADING_SERVICE_URL is set
+    def __init__(self, url, timeout=DEFAULT_TIMEOUT + 5):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    # Function to grade an answer remotely; returns a grading Result (without the parsed expression).
+    # If the service cannot be reached, is overloaded (503) or answers with an error, the verdict is UNAVAILABLE.
+    def check(self, qid, answer, integrand=None):
+        payload = {"question": qid, "answer": answer}
+        if integrand is not None:
+            payload["integrand"] = integrand
+        request = urllib.request.Request(
+            self.url + "/check",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = json.loads(response.read())
+            return grading.Result(data["verdict"], '', data["latex"], data["reason"], data["fingerprint"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # OSError covers HTTPError (503 and the rest), refused connections and timeouts; ValueError, KeyError
+            # and TypeError a body that is not the JSON /check returns
+            return grading.Result(grading.UNAVAILABLE, '')
+
+
+async def serve(host, port, service):
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Grading service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the grading service.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="grading processes (default: all cores)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds allowed per answer")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING, help="grading jobs in flight before answering 503")
+    args = parser.parse_args(argv)
+
+    artifacts.prepare()
+    service = GradingService(workers=args.workers, timeout=args.timeout, max_pending=args.max_pending)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import sys
+import types
+from collections import namedtuple
+
+import bank
+import grading
+
+# Per-session state of the app, kept as one small record so that thousands of
+# open sessions stay cheap. Everything large is shared by the whole process
+# (question bank, compiled references, graded results, generated exercises) and
+# the record only points at it; the parsed SymPy answer is never kept.
+#
+#   python session.py                      # bytes per session for test.py
+#   python session.py --app old_test.py    # ... for another version of the app
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ROOT, "test.py")
+
+# page: "menu" or the topic being reviewed
+# index: index of the bank question in the topic
+# feedback: feedback code of the last check (a verdict, a guard reason code, or BUSY), '' for none
+# answer: the raw text of the last checked answer
+# latex: the LaTeX of the last checked answer (the string cached with its result), '' for none
+# exercise: the generated exercise being answered (shared, from the generator), or None for the bank question
+QuizState = namedtuple("QuizState", "page index feedback answer latex exercise", defaults=("menu", 0, '', '', '', None))
+
+# Feedback code for a random exercise requested before the generator had one ready
+BUSY = "busy"
+BUSY_MESSAGE = "⏳ New exercises are still being prepared. Please try again in a moment."
+
+
+# Function to check if the last checked answer was correct
+def answered_correctly(state):
+    return state.feedback == grading.CORRECT
+
+
+# Function to pick the feedback message to show for the state ('' if none)
+def feedback_message(state):
+    if not state.feedback:
+        return ''
+    if state.feedback == BUSY:
+        return BUSY_MESSAGE
+    last_question = state.exercise is None and state.index == len(bank.QUIZ_DATA[state.page]) - 1
+    return grading.feedback_message(state.feedback, last_question)
+
+
+# Function to estimate the memory reachable from an object, in bytes. Objects whose id is in
+# seen are not counted (and neither is anything only reachable through them); classes,
+# modules and functions are never counted.
+def deep_size(obj, seen):
+    if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    else:
+        for name in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+        if hasattr(obj, "__dict__"):
+            size += deep_size(obj.__dict__, seen)
+    return size
+
+
+# Function to mark every object held by the process-wide caches and data as seen
+def _shared_objects():
+    import cache
+    import preview
+    seen = set()
+    for shared in (bank.TOPICS, bank.QUIZ_DATA, bank.QUESTIONS, cache.verdicts._entries, preview._previews._entries):
+        deep_size(shared, seen)
+    return seen
+
+
+# Function to measure one session's state: total bytes reachable from it, and the bytes
+# it owns (not shared with the process-wide caches)
+def measure(state):
+    return {
+        "keys": len(state),
+        "bytes": deep_size(state, set()),
+        "owned_bytes": deep_size(state, _shared_objects()),
+    }
+
+
+# Function to drive the app through a short session and measure its state after each step
+def run(app_path=APP_PATH, timeout=60):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+
+    def click(label):
+        [button for button in at.button if button.label == label][0].click().run()
+
+    def check(answer):
+        at.text_input(key="answer_input").input(answer)
+        click("Check Answer")
+
+    steps = [
+        ("menu", at.run),
+        ("open", lambda: click("U-Substitution (Math 21)")),
+        ("incorrect", lambda: check("cos2x")),
+        ("correct", lambda: check("-1/2cos2x")),
+        ("next", lambda: click("Next Item")),
+    ]
+    results = {}
+    for name, step in steps:
+        step()
+        if at.exception:
+            raise RuntimeError(f"app failed at step {name!r}: {at.exception[0].message}")
+        results[name] = measure(at.session_state.to_dict())
+    return {
+        "app": os.path.relpath(app_path),
+        "steps": results,
+        "max_bytes": max(step["bytes"] for step in results.values()),
+        "max_owned_bytes": max(step["owned_bytes"] for step in results.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the bytes of state kept per app session.")
+    parser.add_argument("--app", default=APP_PATH, help="app script to measure (default: test.py)")
+    args = parser.parse_args(argv)
+    sys.path.insert(0, ROOT)  # So another version of the app imports this app's modules
+    print(json.dumps(run(os.path.abspath(args.app)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import importlib
+import sys
+import threading
+import time
+
+# Lazy access to the symbolic stack (SymPy, NumPy and checker.py). Importing
+# SymPy takes longer than rendering the menu or the notes, so nothing loads it
+# until it is used. start_warm_up() loads it in a background thread right after
+# startup, together with a first parse, diff and lambdify, so the first
+# "Check Answer" does not pay for it either.
+
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+sp = LazyModule("sympy")
+checker = LazyModule("checker")
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+warm_up_seconds = None  # How long the warm-up took, once it has finished
+
+
+# Function to check whether SymPy has been imported in this process
+def loaded():
+    return "sympy" in sys.modules
+
+
+# Function to load SymPy and run one throwaway check (first parse, diff and lambdify), and
+# load the value of every definite integral in the bank. With build_artifacts, first brings
+# the on-disk artifact cache up to date with the question bank (values included).
+def warm_up(build_artifacts=False):
+    global warm_up_seconds
+    start = time.perf_counter()
+    import bank
+    import grading  # Imported here: grading itself imports this module
+    grading.grade("x", "1")
+    if build_artifacts:
+        import artifacts
+        artifacts.prepare()
+    for definite in bank.definites():
+        checker.definite_value(definite)
+    warm_up_seconds = time.perf_counter() - start
+
+
+# Function to start the warm-up in a background thread (once per process)
+def start_warm_up(build_artifacts=False):
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=warm_up, args=(build_artifacts,), name="sympy-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
@@ -1,54 +1,133 @@
-import streamlit as st
-import sympy as sp
-import re  # Import re for regex-based string manipulation
-
-# Define variable for symbol x to be used in mathematical expressions
-x = sp.symbols('x')
-
-# Values to test equivalence (checking correctness at these points)
-TEST_POINTS = [1,2,3,4,5]
-
-# Function to preprocess user input by ensuring multiplication is implied (like "6x" becoming "6*x")
-def preprocess_input(expression):
-
-    # 0. Process inverse trig inputs
-    expression = re.sub(r'arc', r'a', expression)
+import os
+import time
 
-    # 0.1 Absolute value
-    expression = re.sub(r'\|([^|]+)\|', r'(abs(\1))', expression)
-
-    # 1. Insert * between number and variable (e.g., 2x → 2*x)
-    expression = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', expression)
-
-    # 2. Convert sin2x to sin(2*x), cos3x to cos(3*x), etc.
-    expression = re.sub(r'(sin|cos|tan|csc|sec|cot|sqrt|cbrt|ln|log)(h?)(\d\*)?([a-zA-Z])', r'\1\2(\3\4)', expression)
-    expression = re.sub(r'(sin|cos|tan|csc|sec|cot|sqrt|cbrt|ln|log)(h?)(\d)', r'\1\2(\3)', expression)
-    # 3. Insert * between variable and function (e.g., xsinx → x*sin x)
-    expression = re.sub(r'(x|\))([a-zA-Z])', r'\1*\2', expression)
-
-    expression = re.sub(r'(\d|\))(\()', r'\1*\2', expression)
-
-    return expression
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import analytics  # Warm start of the verdict cache from the attempt log
+import attempt_log  # Write-behind log of every checked answer
+import bank  # Question bank
+import cache  # Shared verdict cache
+import grading  # Parse -> differentiate -> compare pipeline for student answers
+import guard  # Complexity pre-screen (rejection counts for the debug panel)
+import preview  # Parse previews, cached by answer text
+import lessons  # Lesson notes shown above each quiz
+import metrics  # Per-stage timings of answer checks (enable with MATH22_METRICS=1)
+import session  # Compact per-session state record
+import symbolic  # Lazily imported SymPy, warmed up in the background
+from attempt_log import Attempt, AttemptLog
+from executor import GradingExecutor  # Pool of worker processes that run the grading
+from generator import TEMPLATES, ExerciseGenerator  # Randomized exercises, generated in the background
+from preview import Previewer  # Live parse preview of the answer box
+from service import GradingClient  # Client for the headless grading service
+from session import QuizState
+
+# Set GRADING_SERVICE_URL (e.g. http://127.0.0.1:8765) to grade through service.py instead of local workers
+GRADING_SERVICE_URL = os.environ.get("GRADING_SERVICE_URL")
+
+# Topic pages with a button on the menu (the others are "Coming Soon")
+MENU_PAGES = ("u_sub", "ibp", "trig", "trig_sub", "partial_fractions")
+
+
+# One pool of grading workers shared by every session in this server process
+@st.cache_resource
+def get_executor():
+    return GradingExecutor()
+
+
+@st.cache_resource
+def get_client():
+    return GradingClient(GRADING_SERVICE_URL)
+
+
+@st.cache_resource
+def get_previewer():
+    return Previewer()
+
+
+# Background generator of randomized exercises for the pages on the menu, shared by every session
+@st.cache_resource
+def get_generator():
+    return ExerciseGenerator(topics=[topic for topic in TEMPLATES if topic in MENU_PAGES])
+
+
+# Attempt log shared by every session (None when MATH22_ATTEMPT_LOG is set to '')
+@st.cache_resource
+def get_attempt_log():
+    return AttemptLog() if attempt_log.ATTEMPT_LOG_PATH else None
+
+
+# Load the most common answers of past classes (analytics.py --export-warm-start) into the
+# verdict cache once per server process; returns how many were loaded
+@st.cache_resource
+def warm_start_verdicts():
+    return analytics.load_warm_start()
+
+
+# Function to get the question id and integrand being answered: the generated exercise, if any, else the bank question
+def current_question(page, index, exercise=None):
+    if exercise is None:
+        return bank.question_id(page, index), bank.get_question(page, index)[1]
+    return f"{page}:random", exercise.integrand
+
+
+# Function to grade an answer, using the shared cache first.
+# exercise is the generated exercise being answered, if any (instead of bank question index).
+def grade_answer(page, index, answer, exercise=None):
+    question, f_x = current_question(page, index, exercise)
+    with metrics.timer(question, "total"):
+        # Answers already graded (in any session) come straight from the shared cache
+        if cache.verdicts.watch(bank.version()):
+            cache.answer_classes.clear()
+        key = cache.make_key(page, index if exercise is None else f_x, answer)
+        with metrics.timer(question, "cache"):
+            result = cache.verdicts.get(key)
+        if result is not None:
+            return result
+
+        if GRADING_SERVICE_URL:
+            result = get_client().check(question, answer, None if exercise is None else f_x)
+        else:
+            # Grade in a worker process (with a timeout) so a slow answer cannot stall the app
+            result = get_executor().grade(answer, f_x)
+        metrics.record_all(question, result.timings)
+        if result.verdict not in grading.UNCACHED:
+            cache.verdicts.put(key, result)
+        if exercise is None:
+            cache.answer_classes.record(page, index, result.fingerprint)
+        return result
+
+
+# Function to queue a checked answer for the attempt log (written in the background)
+def log_attempt(page, index, exercise, answer, result, seconds):
+    log = get_attempt_log()
+    if log is None:
+        return
+    question, f_x = current_question(page, index, exercise)
+    integrand = f_x.integrand if isinstance(f_x, bank.Definite) else f_x
+    log.record(Attempt(time.time(), session_id(), question, integrand, answer, result.verdict, result.reason,
+                       result.fingerprint, seconds, result.timings))
 
 
 # Main function to control the flow of the Streamlit app
 def main():
     st.title("Integration Techniques")
     
-    # Initialize session state variables if not already present
-    if "page" not in st.session_state:
-        st.session_state.page = "menu"  # Start at the menu page
-    if "question_index" not in st.session_state:
-        st.session_state.question_index = 0  # Start at the first question
-    if "feedback" not in st.session_state:
-        st.session_state.feedback = ""  # No feedback at the start
-    if "user_input" not in st.session_state:
-        st.session_state.user_input = ""  # No user input at the start
-    if "answered_correctly" not in st.session_state:
-        st.session_state.answered_correctly = False  # Track if the answer is correct
+    # All per-session state is one small record (see session.py); change it with update()
+    if "quiz" not in st.session_state:
+        st.session_state.quiz = QuizState()  # Start at the menu page
+
+    # Load SymPy (and precompute the question artifacts) and start the grading workers in the
+    # background while the menu renders, so the first "Check Answer" does not wait for them
+    if not GRADING_SERVICE_URL:
+        symbolic.start_warm_up(build_artifacts=True)
+        get_executor()
+    get_generator()
+    warm_start_verdicts()
 
     # Based on the current page, either show the menu or the quiz
-    if st.session_state.page == "menu":
+    if st.session_state.quiz.page == "menu":
         show_menu()
     else:
         show_notes()
@@ -61,288 +140,8 @@ def main():
 
     
 def show_notes():
-    if st.session_state.page == "u_sub":
-        st.subheader("U-Sub")
-        st.markdown("""
-        - Technique that can solve most of the complicated integral problems (in Math 21).
-        - Used when the integral does not have a direct formula and is already simplified.
-        """)
-        st.write("U-sub is a powerful technique, but the challenge lies in figuring out which expression to substitute with $u$. We can never be certain that our choice of $u$ is correct, so here are the following tips.")
-        
-        st.write('')
-        st.write("**Good candidates for u-sub:**")
-        st.markdown("""
-        1. Inside of a parenthesis (Grouped expressions, base of an exponent, etc.)
-        2. The denominator or the radicand if there is a radical.
-        3. Looking ahead that the resulting $du$ will simplify the integrand (best way and needs practice)
-        4. Practice.
-        5. The $u$ must be simple. Choose $u$ so that there is no need for the product rule or complicated chain rule when obtaining $du$.
-        """)
-        st.write("**Note:** When performing u-sub, the resulting integral must have $u$ as the only variable. There should be no $x$ left. If it is not possible to express all terms of $x$ into $u$, then the choose of $u$ in u-sub is incorrect.")
-        
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example A:')
-        st.latex(r"\int \sec^2 x(\sin x+\tan^2 x) \, dx")
-        st.write("""
-        Before performing u-sub, simplify the integrand first if applicable.
-        """)
-        st.latex(r"= \int (\sec x \tan x + \sec^2 x \tan^2 x) \, dx")
-        st.write("""
-        Next, we can see that the first term can be solved right away, while the second term doesn’t have a direct formula and can’t be simplified further. Thus, it will need u-sub to solve.
-        """)
-        st.latex(r"= \sec x + \int \sec^2 x \tan^2 x \, dx")
-        st.write("""
-        For u-sub, notice that when $u = \\tan x$, then $du = \\sec² x dx$, which is present on the integral. Thus by look ahead, $u = \\tan x$ is a good u-sub as it simplifies the integral further.
-        """)
-        st.latex(r"u = \tan x, \quad \, du = \sec^2 x \, dx \, \ \rightarrow \, \ \frac{1}{\sec^2 x} \, du = dx")
-        st.write("""
-        Hence,
-        """)
-        st.latex(r"= \sec x + \int \sec^2 x \, u^2 \frac{1}{\sec^2 x} \, du")
-        st.latex(r"= \sec x + \int u^2 \, du")
-        st.latex(r"= \sec x + \frac{1}{3} u^3 + C")
-        st.write("""
-        Substitute $x$ back to $u$.
-        """)
-        st.latex(r"= \boxed{\sec x + \frac{1}{3} \tan^3 x + C}")
-        
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example B:')
-        st.latex(r"\int (4x - 1)^2(2x - 1)^4 \, dx")
-        st.write("""
-        One way to solve the integral is to expand the whole expression first, but that approach is too difficult and time-consuming. Instead, we can use u-sub and we have the choice to let $u$ as $4x-1$ or $2x-1$. The better option in this case is $u = 2x - 1$ so that we can avoid expanding $(2x - 1)^4$, and squaring an expression is much simpler than raising it to the fourth power.
-        """)
-        st.latex(r"u = 2x - 1, \quad \, du = 2 \, dx \ \, \rightarrow \, \ \frac{1}{2} du = dx")
-        st.write("""
-        Thus, the integral becomes:
-        """)
-        st.latex(r"= \frac{1}{2} \int (4x - 1)^2 u^4 \, du")
-        st.write("""
-        In the integral, we have the remaining $(4x - 1)^2$ to turn into u before proceeding. To achieve this, we must express $u = 2x - 1$ into $4x - 1$.
-        """)
-        st.latex(r"u = 2x - 1")
-        st.write("""
-        We want the coefficient of $x$ to be $4$, so we multiply by 2:
-        """)
-        st.latex(r"2u = 4x - 2")
-        st.write("""
-        We want $4x - 1$, so next, we add both sides by 1:
-        """)
-        st.latex(r"2u + 1 = 4x - 1")
-        st.write("""
-        Thus, we have:
-        """)
-        st.latex(r"= \frac{1}{2} \int (2u + 1)^2 u^4 \, du")
-        st.write("""
-        Now, this is much easier to simplify.
-        """)
-        st.latex(r"= \frac{1}{2} \int (4u^2 + 4u + 1) u^4 \, du")
-        st.latex(r"= \frac{1}{2} \int (4u^6 + 4u^5 + u^4) \, du")
-        st.latex(r"= \frac{1}{2} \left( \frac{4}{7} u^7 + \frac{4}{6} u^6 + \frac{1}{5} u^5 \right) + C")
-        st.latex(r"= \boxed{\frac{2}{7} (2x - 1)^7 + \frac{1}{3} (2x - 1)^6 + \frac{1}{10} (2x - 1)^5 + C}")
-
-    elif st.session_state.page == "ibp":
-        st.subheader("IBP")
-        st.write('Integration by parts is the "Product Rule" version of integrals. It follows the rule:')
-        st.latex(r"\int u \,dv = uv - \int v \,du")
-        st.write("And choosing the expression for $u$ follows the mnemonic **LIATE**.")
-        st.write("Ayun lang.")
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example A:')
-        st.latex(r"\int x \csc^2 x \, dx")
-        st.write('If we try, for example, applying u-sub on the given problem, we will notice that it leads to nowhere. The given is a product of two expressions, and this is where IBP comes in.')
-        st.write('The given consists of an **A**lgebraic expression $x$ and a **T**rig function $\\csc^2 x$. According to LIATE, A (Algebraic) comes first, so that is our $u$, at bale $dv$ yung natira.')
-        col1, col2 = st.columns(2)
-        with col1:
-            st.latex(r"u=x")
-            st.latex(r"\,du=\,dx")
-        with col2:
-            st.latex(r"\,dv=\csc^2 x\,dx")
-            st.latex(r"v=-\cot x")
-        st.write('')
-        st.write('Thus,')
-        st.latex(r"=-x \cot x - \int -\cot x \, dx")
-        st.latex(r'=\boxed{-x \cot x+\ln{|\sin x}|+C}')
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example B:')
-        st.latex(r"\int_1^e \ln^2 x \, dx")
-        st.write('The given only has the **L**ogarithmic function $\\ln^2 x$ and that can be our $u$. What remained is the $dx$ and that will be our $dv$.')
-        col1, col2 = st.columns(2)
-        with col1:
-            st.latex(r"u=\ln^2 x")
-            st.latex(r"\,du=\frac{2\ln x}{x}\,dx")
-        with col2:
-            st.latex(r"\,dv=\,dx")
-            st.latex(r"v=x")
-        st.write('')
-        st.write('Thus,')
-        st.latex(r"=x \ln^2 x\Big|_1^e - \int_1^e \left(\frac{2\ln x}{x}\right) x \, dx")
-        st.latex(r"=x \ln^2 x\Big|_1^e - 2\int_1^e \ln x \, dx")
-        st.write('For the integral of $\\ln x$, it is still not solvable with u-sub. Hence, we again apply IBP.')
-        col1, col2 = st.columns(2)
-        with col1:
-            st.latex(r"\bar{u}=\ln x")
-            st.latex(r"\,d \bar{u}=\frac{1}{x}\,dx")
-        with col2:
-            st.latex(r"\,d\bar{v}=\,dx")
-            st.latex(r"\bar{v}=x")
-        st.write('')
-        st.write("We have:")
-        st.latex(r"=x \ln^2 x\Big|_1^e - 2\left(x \ln x\Big|_1^e - \int_1^e \, dx\right)")
-        st.latex(r"=x \ln^2 x\Big|_1^e - 2\left(x \ln x\Big|_1^e - x\Big|_1^e \right)")
-        st.write('Be very careful with the parentheses and signs.')
-        st.latex(r"=\Big[x \ln^2 x- 2x \ln x + 2x \Big|_1^e")
-        st.latex(r'=\Big[e \ln^2(e)- 2e \ln(e) + 2e\Big]-\Big[ \ln^2(1)- 2 \ln(1) + 2\Big]')
-        st.latex(r'=\Big[e-2e+2e\Big]-\Big[0-0+2\Big]')
-        st.latex(r'=\boxed{e-2}')
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example C:')
-        st.latex(r"\int e^{3x}\sin(9x) \, dx")
-        st.write('According to LIATE:')
-        col1, col2 = st.columns(2)
-        with col1:
-            st.latex(r"u=\sin(9x)")
-            st.latex(r"\,du=9\cos(9x)\,dx")
-        with col2:
-            st.latex(r"\,dv=e^{3x}\,dx")
-            st.latex(r"v=\frac{1}{3}e^{3x}")
-        st.write('')
-        st.write('Thus,')
-        st.latex(r'=\frac{1}{3}e^{3x}\sin(9x)-3\int e^{3x}\cos(9x) \,dx')
-        st.write('Next, the new integral requires another IBP.')
-        col1, col2 = st.columns(2)
-        with col1:
-            st.latex(r"\bar{u}=\cos(9x)")
-            st.latex(r"\,d\bar{u}=-9\sin(9x)\,dx")
-        with col2:
-            st.latex(r"\,d\bar{v}=e^{3x}\,dx")
-            st.latex(r"\bar{v}=\frac{1}{3}e^{3x}")
-        st.write('')
-        st.write('Now, we have:')
-        st.latex(r'=\frac{1}{3}e^{3x}\sin(9x)-3\left(\frac{1}{3}e^{3x}\cos(9x)+3\int e^{3x}\sin(9x) \,dx\right)')
-        st.write('Simplifying a bit:')
-        st.latex(r'=\frac{1}{3}e^{3x}\sin(9x)-e^{3x}\cos(9x)-9\int e^{3x}\sin(9x) \,dx')
-        st.write('Note that all of these is equal to the original problem.')
-        st.latex(r'\int e^{3x}\sin(9x) \, dx=\frac{1}{3}e^{3x}\sin(9x)-e^{3x}\cos(9x)-9\int e^{3x}\sin(9x) \,dx')
-        st.write('Algebra as follows:')
-        st.latex(r'10\int e^{3x}\sin(9x) \, dx=\frac{1}{3}e^{3x}\sin(9x)-e^{3x}\cos(9x)')
-        st.write('Therefore,')
-        st.latex(r'\int e^{3x}\sin(9x) \, dx=\boxed{\frac{1}{30}e^{3x}\sin(9x)-\frac{1}{10}e^{3x}\cos(9x)+C}')
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example D: (Using the Tabular Method)')
-        st.latex(r"\int x^3 e^{x} \, dx")
-        st.write('Tabular method is a shortcut for applying IBP multiple times. It works best when IBP needs to be performed repeatedly to solve the integral.')
-        st.write('The method follows the same rules for choosing $u$ and $dv$, but instead of applying IBP step by step, you repeatedly differentiate $u$ and integrate $dv$ as part of the shortcut. Assign alternating signs to each row, then multiply diagonally, similar to $uv$ in IBP, and combine them all. The last row is multiplied and forms the last integral.')
-        col1, col2, col3 = st.columns([5,1,5])
-        with col1:
-            st.latex(r'+')
-            st.latex(r'-')
-            st.latex(r'+')
-            st.latex(r'-')
-            st.latex(r'+')
-        with col2:
-            st.latex(r'u=x^3')
-            st.latex(r'3x^2')
-            st.latex(r'6x')
-            st.latex(r'6')
-            st.latex(r'0')
-        with col3:
-            st.latex(r"\,dv=e^x\,dx")
-            st.latex(r"e^x")
-            st.latex(r"e^x")
-            st.latex(r"e^x")
-            st.latex(r"e^x")
-        st.write('')
-        st.write('Now, multiplying diagonally and taking into account of the alternating signs:')
-        st.latex(r'=x^3e^x-3x^2e^x+6xe^x-6e^x+\int (0)(e^x)\,dx')
-        st.write('We already have our final answer.')
-        st.latex(r'=\boxed{x^3e^x-3x^2e^x+6xe^x-6e^x+C}')
-        st.write('')
-        st.write('The tabular method can also be applied to the previous examples, and the row at which you stop differentiating/integrating depends on the integral. If the given does not require many IBPs, then this method is essentially the same as the standard $u$-$dv$ approach.')
-        st.write('')
-        st.markdown('If you are interested, check out this [1 min yt short by bprp](https://youtu.be/N1KLaLi_LjA?si=AF78SVhlNmoBGgbq) on how to utilize the tabular method more effectively.')
-
-    elif st.session_state.page == "trig":
-        st.subheader("Trig Integ")
-        st.write("Trigonometric integrals involve integrating trig functions and applying special techniques, depending on their exponents.")
-        st.write('Recall the following trigonometric identities:')
-        st.markdown("""
-        - $\\sin^2x+\\cos^2x=1$
-        - $\\tan^2x+1=\\sec^2x$
-        - $1+\\cot^2x=\\csc^2x$
-        """)
-        st.markdown("""
-        - $\\sin^2x=\\frac{{1}}{{2}}(1-\\cos(2x))\\quad$(NEW)
-        - $\\cos^2x=\\frac{{1}}{{2}}(1+\\cos(2x))\\quad$(NEW)        
-        """)
-        st.write('The module provides instructions on the procedures to follow depending the trig present and their exponents. However, it is not really required to memorize them to answer different cases of trig integ.')
-        st.write('Trig integ is all about determining when to apply u-sub and when to use trigonometric identities. When performing u-sub, you can anticipate what $du$ will be and whether it will simplify the integral. Ofc, this requires practice if we are opting not to memorize anything. However, there are some special cases that we simply need to remember.')
-        
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example A:')
-        st.latex(r"\int \sec^3x\tan^3x \, dx")
-        st.write("Let's try u-sub, $u=\\tan x$. Looking ahead, $du$ will be $\\sec^2 x$, which means it will cancel two secants on the integrand, leaving one left, $\\sec x$. All the $\\tan x$ can be subsituted into $u$, but it is not possible to turn a single $\\sec x$ in terms of $u$. Usually, when the other trig has an odd number of exponent left, the choice of u-sub is incorrect.")
-        st.write("Next, let's try $u=\\sec x$. Looking ahead, $du$ will be $\\sec x\\tan x$, which will cancel one each with the integrand, leaving two of each left, $\\sec^2 x\\tan^2 x$. All the $\\sec x$ can be substituted into $u$, and the remaining $\\tan^2 x$ can be turned into $\\sec^2 x-1$ using trigonometric identity. Since the exponent of $\\tan x$ is even, it became possible to express all expressions in terms of $u$.")
-        st.write('All of these is an example of a thought process when looking ahead.')
-        st.latex(r"u = \sec x, \quad \, du = \sec x\tan x \, dx")
-        st.write('Thus,')
-        st.latex(r'=\int \sec^2 x\tan^2 x \, du')
-        st.latex(r'=\int \sec^2 x(\sec^2 x-1)) \, du')
-        st.latex(r'=\int u^2(u^2-1)) \, du')
-        st.latex(r'=\int (u^4-u^2) \, du')
-        st.latex(r'=\frac{1}{5}u^5-\frac{1}{3}u^3+C')
-        st.write('Substituting back:')
-        st.latex(r'=\boxed{\frac{1}{5}\sec^5 x-\frac{1}{3}\sec^3 x+C}')
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example B:')
-        st.latex(r"\int \sin^4 x \, dx")
-        st.write("If the exponents of $\\sin x$ and $\\cos x$ are both even, then we apply the (NEW) trigonometric identities we've learned. If for example that one of them has an odd exponent, then it's just u-sub.")
-        st.write("Exponent of $\\cos x$ in our given is 0 since it's not there, so technically even.")
-        st.latex(r"= \int (\sin^2 x)^2 \, dx")
-        st.latex(r"= \int \left(\frac{1}{2}(1-\cos(2x))\right)^2 \, dx")
-        st.latex(r"= \frac{1}{4} \int (1-2\cos(2x)+\cos^2(2x)) \, dx")
-        st.write('We can easily integrate the first two terms.')
-        st.latex(r"= \frac{1}{4}(x-\sin(2x)) + \frac{1}{4} \int \cos^2(2x) \, dx")
-        st.write('Since the exponent of $\\cos x$ is still even, we apply again the (NEW) trig identity.')
-        st.latex(r"= \frac{1}{4}(x-\sin(2x)) + \frac{1}{4} \int \frac{1}{2}(1+\cos(4x)) \, dx")
-        st.latex(r"= \frac{1}{4}(x-\sin(2x)) + \frac{1}{8} \left(x+\frac{1}{4}\sin(4x)\right)+C")
-        st.write('Simplifying a bit:')
-        st.latex(r"= \boxed{\frac{3}{8}x-\frac{1}{4}\sin(2x) + \frac{1}{32}\sin(4x)+C}")
-
-        st.write(''); st.write(''); st.write('')
-        st.subheader('Example C:')
-        st.latex(r"\int \csc^3 x \, dx")
-        st.write('If the exponent of $\\sec x$ OR $\\csc x$ is odd AND the exponent of $\\tan x$ OR $\\cot x$ is even, then the only way to solve the trig integ is thru IBP.')
-        st.write('Otherwise, if the exponent of $\\sec x$ OR $\\csc x$ is even OR the exponent of $\\tan x$ OR $\\cot x$ is odd, then they are much simpler. Either by trigonometric identity or just u-sub. (More of these cases on the Exercise)')
-        st.write('When performing IBP on a trig integ, put an expression on $dv$ that is easy to integrate.')
-        col1, col2, col3 = st.columns([3,1,8])
-        with col1:
-            st.latex(r'+')
-            st.latex(r'-')
-        with col2:
-            st.latex(r'u=\csc x')
-            st.latex(r'du=-\csc x\cot x')
-        with col3:
-            st.latex(r"dv=\csc^2 x \,dx")
-            st.latex(r"v=-\cot x")
-        st.write('')
-        st.write('Thus,')
-        st.latex(r'=-\csc x\cot x - \int \csc x\cot^2 x \, dx')
-        st.write('The exponent of $\\csc x$ and $\\cot x$ are odd and even, but we have already applied IBP. To proceed, we will apply trigonometric identity on the even exponent trig.')
-        st.latex(r'=-\csc x\cot x - \int \csc x(\csc^2 x-1) \, dx')
-        st.latex(r'=-\csc x\cot x - \int (\csc^3 x-\csc x) \, dx')
-        st.latex(r'=-\csc x\cot x +\ln{|\csc x-\cot x|} - \int \csc^3 x \, dx')
-        st.write('Note that all of these is equal to the original problem.')
-        st.latex(r'\int \csc^3 x \, dx=-\csc x\cot x +\ln{|\csc x-\cot x|} - \int \csc^3 x \, dx')
-        st.write('Performing algebra and simplifying:')
-        st.latex(r'2\int \csc^3 x \, dx=-\csc x\cot x +\ln{|\csc x-\cot x|}')
-        st.latex(r'\int \csc^3 x \, dx=\boxed{-\frac{1}{2}\csc x\cot x +\frac{1}{2}\ln{|\csc x-\cot x|}}')
+    # Lesson content lives in lessons.py and is compiled once per server process
+    lessons.render(st.session_state.quiz.page)
 
     st.write(""); st.write(""); st.write(""); st.write(""); st.write("")
 
@@ -387,26 +186,17 @@ def show_menu():
     if st.button("Integration by Parts"):
         set_page("ibp")
 
-    st.markdown("""
-        <div class="hover-button">
-            Trigonometric Integrals
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("""
-        <div class="hover-button">
-            Trigonometric Substitution
-        </div>
-        """, unsafe_allow_html=True)
-    
+    if st.button("Trigonometric Integrals"):
+        set_page("trig")
+
+    if st.button("Trigonometric Substitution"):
+        set_page("trig_sub")
+
     col11, col12, col13 = st.columns([2, 6, 2])
     # Button to go back to the menu
     with col11:
-        st.markdown("""
-            <div class="hover-button">
-                Partial Fractions
-            </div>
-            """, unsafe_allow_html=True)
+        if st.button("Partial Fractions"):
+            set_page("partial_fractions")
     with col13:
         st.markdown("""
             <div class="hover-button">
@@ -416,126 +206,147 @@ def show_menu():
 
 
 
+# Function to change fields of the session's state record
+def update(**changes):
+    st.session_state.quiz = st.session_state.quiz._replace(**changes)
+
 # Function to change the current page
 def set_page(page):
-    st.session_state.page = page  # Set the current page (menu or quiz)
-    st.session_state.feedback = ""  # Clear feedback when changing pages
-    st.session_state.user_input = ""  # Clear user input
-    st.session_state.answered_correctly = False  # Reset answer correctness state when navigating to menu
+    st.session_state.quiz = QuizState(page)  # New page, first question, no feedback or answer
     st.rerun()  # Re-run the app to update the state
 
-# Function to display the current quiz question and handle user input
+# Function to get the id of this browser session (names its preview requests)
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else ""
+
+# Function to rerun only the quiz fragment (the whole app if this is not a fragment rerun)
+def rerun_quiz():
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+# Function to display the parse preview of an answer
+def show_preview(answer, shown):
+    if shown.ok:
+        st.caption("Preview:")
+        st.latex(shown.latex)
+    else:
+        st.caption(shown.message)
+        if shown.position is not None:
+            st.code(answer + "\n" + " " * shown.position + "^", language=None)
+
+
+# Function to poll for a preview that was not ready in time; reruns the app once it is
+@st.fragment(run_every=0.5)
+def show_pending_preview(answer):
+    if preview.cached(answer) is not None:
+        st.rerun()
+    st.caption("Reading your answer...")
+
+
+# Function to display the current quiz question and handle user input.
+# Runs as a fragment: checking an answer reruns only the quiz, not the notes above it.
+@st.fragment
 def show_quiz():
-    # Define the quiz data with integrals and their expected answers for different quiz types
-    quiz_data = {
-        "u_sub": [
-            (r"\int \sin(2x) \,dx", "sin(2*x)"),
-            (r"\int 2^{x^2}x \,dx", "x*2^(x^2)"),
-            (r"\int \frac{x+1}{\sqrt{x-1}} \,dx", "(x+1)/sqrt(x-1)")
-        ],
-        "ibp": [
-            (r"\int x^2\ln x \,dx", "x^2*ln(x)"),  # Question 1, integrand is x²
-            (r"\int x \tan^{-1}x \,dx", "x*atan(x)"), # Question 2, integrand is 2x²
-            (r"\int x^2 \sin(2x) \,dx", "x^2*sin(2*x)")  # Question 3, integrand is 3x²
-        ],
-        "trig": [
-            (r"\int \cot^4x \,dx", "(cot(x))**4"), # Question 1, integrand is x³
-            (r"\int \tan^3x \,dx", "(tan(x))**3"), # Question 2, integrand is 2x³
-            (r"\int \sin^5x \cos^4x \,dx", "(sin(x))**5*(cos(x))**4")  # Question 3, integrand is 3x³
-        ]
-    }
-
-    # Get the current question (integral expression) and expected answer
-    integral_expr, f_x = quiz_data[st.session_state.page][st.session_state.question_index]
+    # Get the current question (integral expression): a generated exercise, or the bank question
+    state = st.session_state.quiz
+    exercise = state.exercise
+    if exercise is None:
+        integral_expr, _ = bank.get_question(state.page, state.index)
+        heading = f'{state.index+1}.'
+        label = f"Enter your answer for Exercise No. {state.index + 1}:"
+    else:
+        integral_expr = exercise.prompt
+        heading = "Random exercise"
+        label = "Enter your answer for the random exercise:"
 
     st.subheader("EXERCISE:")
     st.write('Evaluate the following.')
-    st.subheader(f'{st.session_state.question_index+1}.')
+    st.subheader(heading)
     st.latex(integral_expr)
 
     # Input box for the user to enter their answer
-    user_answer = st.text_input(f"Enter your answer for Exercise No. {st.session_state.question_index + 1}:", key="answer_input")
+    user_answer = st.text_input(label, key="answer_input")
+
+    # Preview of the answer before it is checked: how it was read, or what is wrong with it.
+    # Not on the run that checks it: grading reads the answer anyway, so the check never waits for a preview.
+    checking = st.session_state.get("check_answer", False)
+    if user_answer and user_answer != state.answer and not checking:
+        shown = get_previewer().preview(session_id(), user_answer)
+        if shown is None:
+            show_pending_preview(user_answer)
+        else:
+            show_preview(user_answer, shown)
     
     # Add the "Check Answer" button
-    if st.button("Check Answer"):
-        user_expr = ''
+    if st.button("Check Answer", key="check_answer"):
         if user_answer:
-            try:
-                # Preprocess the input to ensure multiplication is implied where needed
-                user_answer = preprocess_input(user_answer.replace(" ",""))
-
-                # Convert input string to sympy expression
-                user_expr = sp.sympify(user_answer)
-
-                # Store user input for display
-                st.session_state.user_input = user_expr
-                
-                user_expr2 = sp.sympify(re.sub(r'Abs', r'', str(user_expr)))
-
-                # Differentiate the student's answer (g x) to compare with the integrand
-                g_x = sp.diff(user_expr2, x)
-
-                # Convert f x (the expected answer) string into a sympy expression
-                f_x_expr = sp.sympify(f_x)
-
-                # Check if f x = g x at test points (1, 2, 3, 4, 5)
-                correct_vals = [str(f_x_expr.subs(x, v).evalf(5)) for v in TEST_POINTS]
-                user_vals = [str(g_x.subs(x, v).evalf(5)) for v in TEST_POINTS]
-                # Check if results match
-                if correct_vals == user_vals:
-                    if st.session_state.question_index == 2:
-                        st.session_state.feedback = "✅ ⭐ Gudjob! ⭐"
-                    else:
-                        st.session_state.feedback = "✅ Correct!"  # Provide positive feedback if correct
-                    st.session_state.answered_correctly = True
-                else:
-                    #st.session_state.feedback = f"❌ {correct_vals} & {user_vals}"
-                    st.session_state.feedback = "❌ Incorrect. Try again!"  # Provide negative feedback if incorrect
-                    st.session_state.answered_correctly = False
-
-
-            except Exception:
-                # Handle any errors (e.g., invalid user input) and provide feedback
-                #st.session_state.feedback = f"⚠️ {user_expr}"
-                st.session_state.feedback = f"⚠️ Invalid input. Please enter a valid mathematical expression."
-                st.session_state.answered_correctly = False
-
-            st.session_state.user_input = user_expr  # Store the input for display
-            st.rerun()  # Ensure the page re-runs to update the state
+            start = time.perf_counter()
+            known = preview.cached(user_answer)
+            # If the preview already found it unreadable, there is no need to send it for grading
+            result = preview.to_result(known) if known is not None else None
+            if result is None:
+                result = grade_answer(state.page, state.index, user_answer, exercise)
+            log_attempt(state.page, state.index, exercise, user_answer, result, time.perf_counter() - start)
+            # Keep only the answer text, its feedback code and the shared LaTeX string (not the parsed answer)
+            update(feedback=grading.feedback_code(result), answer=user_answer, latex=result.latex)
+            rerun_quiz()  # Ensure the quiz re-runs to update the state
 
 
     # Display user input beautifully
-    if st.session_state.user_input:
+    if state.latex:
         st.write("Your input:")
-        # Modified regex to handle both inverse trig and log/ln cases
-        latex_output = sp.latex(st.session_state.user_input)
-        latex_output = re.sub(r'(operatorname{a)(sin|cos|tan|csc|sec|cot)(h?)', r'\2\3^{-1', latex_output)
-        latex_output = re.sub(r'\\log', r'\\ln', latex_output)  # Replace log with ln
-        st.latex(latex_output)
+        # LaTeX was rendered once when the answer was graded (inverse trig and log/ln already rewritten)
+        st.latex(state.latex)
 
 
     # Display feedback (correct/incorrect)
-    st.write(st.session_state.feedback)
+    st.write(session.feedback_message(state))
 
     # Show "Next" button if the answer is correct
-    if st.session_state.answered_correctly:
-        if st.session_state.question_index < len(quiz_data[st.session_state.page]) - 1:
+    if session.answered_correctly(state) and exercise is None:
+        if state.index < len(bank.QUIZ_DATA[state.page]) - 1:
             # If there is a next question, show the "Next" button
             if st.button("Next Item"):
-                st.session_state.question_index += 1  # Go to the next question
-                st.session_state.answered_correctly = False  # Reset after going to the next question
-                st.session_state.user_input = ''
-                st.session_state.feedback = ""
-                st.rerun()  # Ensure page updates correctly
+                st.session_state.quiz = QuizState(state.page, state.index + 1)  # Go to the next question
+                rerun_quiz()  # Ensure the quiz updates correctly
+
+    # Button for a randomized exercise, taken from the generator's ready queue (never waits for one)
+    if state.page in TEMPLATES:
+        if st.button("🎲 Random Exercise" if exercise is None else "🎲 Another Random Exercise"):
+            new_exercise = get_generator().pop(state.page)
+            if new_exercise is None:
+                update(feedback=session.BUSY)
+            else:
+                st.session_state.quiz = QuizState(state.page, state.index, exercise=new_exercise)
+            rerun_quiz()
 
 
     col21, col22, col23 = st.columns([1, 8, 1])
     # Button to go back to the menu
     with col23:
         if st.button("Back"):
-            st.session_state.question_index = 0
             set_page("menu")
 
+    # Debug panel with per-stage timings (only when MATH22_METRICS=1)
+    if metrics.ENABLED:
+        with st.expander("Check timings (debug)"):
+            st.dataframe(metrics.summary(), hide_index=True)
+            st.write("Distinct answers (equivalence classes) per exercise:")
+            st.dataframe([{"question": bank.question_id(page, index), "classes": count}
+                          for (page, index), count in sorted(cache.answer_classes.counts().items())], hide_index=True)
+            st.write("Answers rejected by the pre-screen:")
+            st.dataframe([{"reason": reason, "count": count}
+                          for reason, count in sorted(guard.rejection_counts().items())], hide_index=True)
+            st.write("Exercise generator:")
+            st.dataframe(get_generator().report(), hide_index=True)
+            if get_attempt_log() is not None:
+                st.write("Attempt log:")
+                st.dataframe([get_attempt_log().stats()], hide_index=True)
+            st.download_button("Download Prometheus metrics", metrics.render_prometheus(), file_name="math22.prom")
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+import grading
+import guard
+from lexer import preprocess_input
+
+# Regression corpora for the lexer, the pre-screen and grading, run with:
+#
+#   python -m pytest test_corpora.py
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _load(name):
+    with open(os.path.join(ROOT, name)) as f:
+        return json.load(f)
+
+
+# Compatibility corpus for the old regex-based preprocess_input:
+#   "same":  inputs it accepted, with the output it produced (the lexer must match exactly)
+#   "fixed": inputs it misread (exp(x) -> ex*p(x), sinh(x) -> sin(h)*(x), e^x with e a symbol, ...),
+#            with its output and the output the lexer gives instead
+LEXER_CORPUS = _load("lexer_corpus.json")
+LEXER_CASES = [(text, expected) for text, expected in LEXER_CORPUS["same"]]
+LEXER_CASES += [(text, expected) for text, _legacy, expected in LEXER_CORPUS["fixed"]]
+
+# Answers with the reason code the screen must give them (regressions included)
+GUARD_CASES = _load("guard_corpus.json")
+
+# Answers with the integrand they are checked against and the verdict they must get
+# (answers that once made grade() raise included)
+GRADING_CASES = _load("grading_corpus.json")
+
+
+@pytest.mark.parametrize("text, expected", LEXER_CASES, ids=[text for text, _ in LEXER_CASES])
+def test_lexer(text, expected):
+    assert preprocess_input(text) == expected
+
+
+@pytest.mark.parametrize("answer, reason", GUARD_CASES, ids=[answer[:40] for answer, _ in GUARD_CASES])
+def test_guard(answer, reason):
+    assert guard.screen(answer).reason == reason
+
+
+@pytest.mark.parametrize("answer, f_x, verdict", GRADING_CASES, ids=[f"{answer} | {f_x}" for answer, f_x, _ in GRADING_CASES])
+def test_grading(answer, f_x, verdict):
+    assert grading.grade(answer, f_x).verdict == verdict